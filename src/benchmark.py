@@ -0,0 +1,686 @@
+import os
+import glob
+import time
+import copy
+import contextlib
+import io
+import shutil
+import tempfile
+from queue import PriorityQueue
+from dataclasses import dataclass
+from math import ceil, log
+
+import numpy as np
+
+from roommodel.model import RoomModel
+from roommodel.file_loader import FileLoader
+from roommodel.directed import DirectedAgent
+from roommodel.field_store import encode_field, decode_field, LandmarkStore, HierarchicalStore
+from roommodel.utils.room import compute_static_field, compute_source_field, normalize_grid,\
+    compute_source_distances, compute_source_fields_wavefront
+from roommodel.utils.constants import MAP_SYMBOLS, GATE, EMPTY, SFF_STORAGE_TYPES, KS, KO, KD, OCCUPIED_CELL, MANEUVERS
+
+
+@dataclass
+class Node:
+    coords: (int, int)
+    obstacle: bool
+    price: int = float("inf")
+    visited: bool = False
+
+    def enter(self, parent):
+        self.price = parent.price + self.distance(parent)
+
+    def distance(self, other):
+        sigma = np.power(self.coords[0] - other.coords[0], 2)
+        sigma += np.power(self.coords[1] - other.coords[1], 2)
+        return np.sqrt(sigma)
+
+    def neighbours(self, width, height):
+        valid_coords = []
+        for x in [-1, 0, 1]:
+            for y in [-1, 0, 1]:
+                if 0 <= self.coords[0] + x < width and 0 <= self.coords[1] + y < height:
+                    if x == 0 and y == 0:
+                        continue
+                    valid_coords.append((self.coords[0] + x, self.coords[1] + y))
+        return valid_coords
+
+    def __lt__(self, other):
+        return self.price < other.price
+
+
+def compute_static_field_reference(grid, normalize=False):
+    # original Node and PriorityQueue implementation of compute_static_field
+    q = PriorityQueue()
+    grid_nodes = []
+    gate = None
+    height, width = grid.shape
+    for y in range(height):
+        grid_nodes.append([])
+        for x in range(width):
+            coords = (x, y)
+            np_coords = (y, x)
+            node = Node(coords, grid[np_coords] < 0)
+            if grid[np_coords] == 100:
+                gate = Node(coords, False)
+                node = gate
+            grid_nodes[y].append(node)
+
+    if not gate:
+        raise ValueError("Gate is not present in the map. Can't compute static field.")
+
+    gate.price = 0
+    q.put(gate)
+    cnt = 0
+    closest_2power = int(ceil(log(width*height) / log(2)))
+    closest_2mod = 2**closest_2power
+    while q.qsize() > 0:
+        cnt += 1
+        if cnt % closest_2mod == 0:
+            print(q.qsize(), cnt)
+        current_node = q.get()
+        current_node.visited = True
+        while current_node.obstacle:
+            current_node = q.pop()
+        for coords in current_node.neighbours(width, height):
+            x, y = coords
+            other_node = grid_nodes[y][x]
+            if not other_node.obstacle:
+                if not other_node.visited:
+                    other_node.visited = True
+                    distance = current_node.distance(other_node)
+                    if current_node.price + distance < other_node.price:
+                        other_node.enter(current_node)
+                        q.put(other_node)
+    static_field = np.zeros(grid.shape)
+    for x in range(width):
+        for y in range(height):
+            np_coords = (y, x)
+            static_field[np_coords] = grid_nodes[y][x].price
+    if normalize:
+        return normalize_grid(static_field)
+    return static_field
+
+
+def source_rooms(fl, n_sources):
+    # yields room copies with the gate moved to n_sources walkable cells evenly spread over the map
+    room = copy.deepcopy(fl.get_room())
+    gate = fl.get_gate()
+    room[gate[1], gate[0]] = MAP_SYMBOLS[EMPTY]
+    ys, xs = np.nonzero(room >= 0)
+    stride = max(1, len(xs) // n_sources)
+    for y, x in zip(ys[::stride], xs[::stride]):
+        room[y, x] = MAP_SYMBOLS[GATE]
+        yield room
+        room[y, x] = MAP_SYMBOLS[EMPTY]
+
+
+def benchmark_static_field(topology_folder="./maps/topology", n_sources=20):
+    # compares the array kernel of compute_static_field with the original Node/PriorityQueue implementation
+    print("map".ljust(26), "cells".rjust(6), "reference ms".rjust(13), "kernel ms".rjust(10),
+          "speedup".rjust(8), "max diff".rjust(9), "longer".rjust(7))
+    for filename in sorted(glob.glob(os.path.join(topology_folder, "*.txt"))):
+        try:
+            fl = FileLoader(os.path.abspath(filename), static_fields=False)
+        except ValueError as e:
+            print(os.path.basename(filename).ljust(26), "skipped:", e)
+            continue
+        reference_time = 0
+        kernel_time = 0
+        max_diff = 0
+        longer = 0
+        n = 0
+        for room in source_rooms(fl, n_sources):
+            start = time.perf_counter()
+            # the reference implementation prints its progress
+            with contextlib.redirect_stdout(io.StringIO()):
+                reference = compute_static_field_reference(room)
+            reference_time += time.perf_counter() - start
+            start = time.perf_counter()
+            field = compute_static_field(room)
+            kernel_time += time.perf_counter() - start
+            if not np.array_equal(np.isinf(reference), np.isinf(field)):
+                raise ValueError("Kernel reachability differs from reference in " + filename)
+            finite = np.isfinite(reference)
+            max_diff = max(max_diff, np.max(np.abs(reference[finite] - field[finite])))
+            # the reference marks cells visited on discovery, behind obstacle corners it can miss a shorter path
+            longer += np.sum(reference[finite] - field[finite] > 1e-9)
+            n += 1
+        print(os.path.basename(filename).ljust(26), str(fl.width * fl.height).rjust(6),
+              ('%.3f' % (1000 * reference_time / n)).rjust(13), ('%.3f' % (1000 * kernel_time / n)).rjust(10),
+              ('%.1fx' % (reference_time / kernel_time)).rjust(8), ('%.1e' % max_diff).rjust(9), str(longer).rjust(7))
+
+
+def static_probabilities(static_field, ks=3):
+    # P_s of the 3x3 neighbourhood of every cell without occupancy and diagonal penalty, np.array(9, height, width)
+    height, width = static_field.shape
+    padded = np.pad(static_field, 1, constant_values=np.inf)
+    neighbourhood = np.stack([padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+                              for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    with np.errstate(invalid="ignore", over="ignore"):
+        top = np.exp(-ks * (neighbourhood - static_field))
+        return top / np.sum(top, axis=0)
+
+
+def benchmark_quantization(topology_folder="./maps/topology", n_sources=20):
+    # size of the SFF tensor and the error of movement probabilities for each storage type against float64
+    print("map".ljust(26), "type".ljust(8), "bytes/field".rjust(12), "file MB".rjust(8),
+          "max dist err".rjust(13), "max P err".rjust(10))
+    for filename in sorted(glob.glob(os.path.join(topology_folder, "*.txt"))):
+        try:
+            fl = FileLoader(os.path.abspath(filename), static_fields=False)
+        except ValueError as e:
+            print(os.path.basename(filename).ljust(26), "skipped:", e)
+            continue
+        fields = [compute_static_field(room) for room in source_rooms(fl, n_sources)]
+        n_fields = np.count_nonzero(fl.get_room() >= 0)
+        for dtype in SFF_STORAGE_TYPES:
+            max_dist_err = 0
+            max_p_err = 0
+            for field in fields:
+                decoded = decode_field(encode_field(field, dtype))
+                finite = np.isfinite(field)
+                max_dist_err = max(max_dist_err, np.max(np.abs(decoded[finite] - field[finite])))
+                exact = static_probabilities(field)[:, finite]
+                approx = static_probabilities(decoded)[:, finite]
+                # cells without reachable neighbours have nan probabilities in both
+                max_p_err = max(max_p_err, np.nanmax(np.abs(approx - exact)))
+            field_bytes = fl.width * fl.height * np.dtype(dtype).itemsize
+            print(os.path.basename(filename).ljust(26), np.dtype(dtype).name.ljust(8), str(field_bytes).rjust(12),
+                  ('%.2f' % (n_fields * field_bytes / 2 ** 20)).rjust(8), ('%.1e' % max_dist_err).rjust(13),
+                  ('%.1e' % max_p_err).rjust(10))
+
+
+def benchmark_pairwise(topology_folder="./maps/topology"):
+    # precompute time and size of full fields of all sources against distances of pairs stored once
+    print("map".ljust(26), "sources".rjust(8), "fields s".rjust(9), "pairs s".rjust(8),
+          "fields MB".rjust(10), "pairs MB".rjust(9))
+    for filename in sorted(glob.glob(os.path.join(topology_folder, "*.txt"))):
+        try:
+            fl = FileLoader(os.path.abspath(filename), static_fields=False)
+        except ValueError as e:
+            print(os.path.basename(filename).ljust(26), "skipped:", e)
+            continue
+        room = copy.deepcopy(fl.get_room())
+        gate = fl.get_gate()
+        room[gate[1], gate[0]] = MAP_SYMBOLS[EMPTY]
+        sources = [(x, y) for x in range(fl.width) for y in range(fl.height) if room[y, x] >= 0]
+        n = len(sources)
+        start = time.perf_counter()
+        for source in sources:
+            compute_source_field(room, source)
+        fields_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for idx in range(n):
+            compute_source_distances(room, sources, idx)
+        pairs_time = time.perf_counter() - start
+        print(os.path.basename(filename).ljust(26), str(n).rjust(8), ('%.2f' % fields_time).rjust(9),
+              ('%.2f' % pairs_time).rjust(8), ('%.2f' % (n * room.size * 8 / 2 ** 20)).rjust(10),
+              ('%.2f' % (n * (n + 1) // 2 * 8 / 2 ** 20)).rjust(9))
+
+
+def benchmark_landmarks(size=200, n_landmarks=16, n_queries=20, seed=0):
+    # distance oracle on a large room with pillars: memory, tightness of bounds and search for the most distant agent
+    rng = np.random.default_rng(seed)
+    room = np.zeros(shape=(size, size))
+    room[[0, -1], :] = MAP_SYMBOLS["#"]
+    room[:, [0, -1]] = MAP_SYMBOLS["#"]
+    pillars = rng.integers(1, size - 1, size=(size * size // 20, 2))
+    room[pillars[:, 0], pillars[:, 1]] = MAP_SYMBOLS["#"]
+    start = time.perf_counter()
+    oracle = LandmarkStore(room, n_landmarks)
+    build_time = time.perf_counter() - start
+    n_walkable = np.count_nonzero(room >= 0)
+    print("room", size, "x", size, "walkable", n_walkable, "landmarks", n_landmarks,
+          "built in %.2f s" % build_time)
+    print("landmark fields MB %.1f, all-pairs fields MB %.1f" %
+          (oracle.landmark_fields.nbytes / 2 ** 20, n_walkable * room.size * 8 / 2 ** 20))
+    ys, xs = np.nonzero(room >= 0)
+    gaps = []
+    full_time = 0
+    oracle_time = 0
+    for _ in range(n_queries):
+        # a crowd of 40 agents within 15 cells of the virtual leader
+        source = rng.integers(len(xs))
+        source = (int(xs[source]), int(ys[source]))
+        near = np.nonzero((np.abs(xs - source[0]) < 15) & (np.abs(ys - source[1]) < 15))[0]
+        positions = [(int(xs[i]), int(ys[i])) for i in rng.choice(near, size=min(40, len(near)), replace=False)]
+        start = time.perf_counter()
+        exact = compute_source_field(room, source)
+        expected = max(exact[y, x] for x, y in positions)
+        full_time += time.perf_counter() - start
+        start = time.perf_counter()
+        distance, _ = oracle.farthest(source, positions)
+        oracle_time += time.perf_counter() - start
+        if distance != expected:
+            raise ValueError("Landmark oracle differs from the exact field.")
+        lower, upper = oracle.bounds(source, positions)
+        exact_positions = np.array([exact[y, x] for x, y in positions])
+        gaps.append(np.mean((upper - lower)[exact_positions > 0] / exact_positions[exact_positions > 0]))
+    print("mean relative bound gap %.2f, most distant agent: full field %.1f ms, pruned search %.1f ms" %
+          (np.mean(gaps), 1000 * full_time / n_queries, 1000 * oracle_time / n_queries))
+
+
+def building(n_rooms, room_size=20, door_width=2):
+    # n_rooms x n_rooms grid of square rooms, neighbouring rooms are joined by a door in the middle of the wall
+    size = n_rooms * (room_size + 1) + 1
+    room = np.zeros(shape=(size, size))
+    room[::room_size + 1, :] = MAP_SYMBOLS["#"]
+    room[:, ::room_size + 1] = MAP_SYMBOLS["#"]
+    middle = room_size // 2
+    for i in range(n_rooms):
+        for wall in range(1, n_rooms):
+            start = i * (room_size + 1) + middle
+            room[start:start + door_width, wall * (room_size + 1)] = MAP_SYMBOLS[EMPTY]
+            room[wall * (room_size + 1), start:start + door_width] = MAP_SYMBOLS[EMPTY]
+    return room
+
+
+def benchmark_hierarchical(n_rooms_list=(2, 4, 8), n_fields=10):
+    # precompute, memory and time per field of hierarchical fields on buildings of more and more rooms
+    print("rooms".rjust(6), "cells".rjust(7), "doors".rjust(6), "build s".rjust(8), "hier MB".rjust(8),
+          "all-pairs MB".rjust(13), "hier ms".rjust(8), "flat ms".rjust(8))
+    for n_rooms in n_rooms_list:
+        room = building(n_rooms)
+        start = time.perf_counter()
+        store = HierarchicalStore(room)
+        build_time = time.perf_counter() - start
+        memory = sum(local.nbytes for local in store.local) + store.door_distances.nbytes
+        ys, xs = np.nonzero(room >= 0)
+        sources = [(int(xs[i]), int(ys[i])) for i in range(0, len(xs), len(xs) // n_fields)]
+        start = time.perf_counter()
+        for source in sources:
+            store.compute_field(source)
+        hierarchical_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for source in sources:
+            compute_source_field(room, source)
+        flat_time = time.perf_counter() - start
+        print(str(n_rooms ** 2).rjust(6), str(len(xs)).rjust(7), str(len(store.doors)).rjust(6),
+              ('%.2f' % build_time).rjust(8), ('%.2f' % (memory / 2 ** 20)).rjust(8),
+              ('%.1f' % (len(xs) * room.size * 8 / 2 ** 20)).rjust(13),
+              ('%.1f' % (1000 * hierarchical_time / len(sources))).rjust(8),
+              ('%.1f' % (1000 * flat_time / len(sources))).rjust(8))
+
+
+def benchmark_wavefront(topology_folder="./maps/topology", batch_sizes=(1, 8, 64, 256)):
+    # time per field of wavefront sweeps over batches of sources against one heap search per source
+    print("map".ljust(26), "sources".rjust(8), "dijkstra ms".rjust(12),
+          *[("k=%d ms" % k).rjust(9) for k in batch_sizes], "max diff".rjust(9))
+    for filename in sorted(glob.glob(os.path.join(topology_folder, "*.txt"))):
+        try:
+            fl = FileLoader(os.path.abspath(filename), static_fields=False)
+        except ValueError as e:
+            print(os.path.basename(filename).ljust(26), "skipped:", e)
+            continue
+        room = fl.room_without_gate()
+        sources = fl.room_sources(room)
+        start = time.perf_counter()
+        fields = np.array([compute_source_field(room, source) for source in sources])
+        dijkstra_time = time.perf_counter() - start
+        times = []
+        diff = 0
+        for k in batch_sizes:
+            start = time.perf_counter()
+            batches = [compute_source_fields_wavefront(room, sources[i:i + k]) for i in range(0, len(sources), k)]
+            times.append(time.perf_counter() - start)
+            wavefront = np.concatenate(batches)
+            if not np.array_equal(np.isinf(wavefront), np.isinf(fields)):
+                raise ValueError("Wavefront reaches other cells than Dijkstra.")
+            walkable = ~np.isinf(fields)
+            diff = max(diff, np.max(np.abs(wavefront[walkable] - fields[walkable]), initial=0))
+        print(os.path.basename(filename).ljust(26), str(len(sources)).rjust(8),
+              ('%.3f' % (1000 * dijkstra_time / len(sources))).rjust(12),
+              *[('%.3f' % (1000 * t / len(sources))).rjust(9) for t in times], ('%.0e' % diff).rjust(9))
+
+
+def benchmark_first_step(maps=("map22.txt", "10V.txt", "room1.txt"), topology_folder="./maps/topology"):
+    # time from loading a map without stored fields to the end of the first step of the model,
+    # all fields computed before the start against progressive loading on a background thread
+    print("map".ljust(26), "blocking s".rjust(11), "progressive s".rjust(14), "all fields s".rjust(13))
+    for map_name in maps:
+        times = []
+        for progressive in [False, True]:
+            with tempfile.TemporaryDirectory() as maps_folder:
+                filename = os.path.join(maps_folder, "topology", map_name)
+                os.makedirs(os.path.dirname(filename))
+                shutil.copy(os.path.join(topology_folder, map_name), filename)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fl = FileLoader(filename, processes=1, progressive=progressive)
+                    model = RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=3,
+                                      penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl)
+                    model.step()
+                times.append(time.perf_counter() - start)
+                if progressive:
+                    fl.sff.complete.wait()
+                    fl.sff.thread.join()
+                    times.append(time.perf_counter() - start)
+        print(map_name.ljust(26), ('%.2f' % times[0]).rjust(11), ('%.2f' % times[1]).rjust(14),
+              ('%.2f' % times[2]).rjust(13))
+
+
+def attraction_reference(agent, sff, cells):
+    # original implementation of Agent.attraction with dicts and a 5x5 neighbourhood
+    ko = agent.k[KO]
+    kd = agent.k[KD]
+    discipline = 1
+    distance_to_leader = agent.leader_dist()
+    if agent.kind.is_follower() and distance_to_leader > 0:
+        discipline += 1 / distance_to_leader
+    ks = agent.k[KS] * discipline
+    P_s = {'top': {}, 'bottom_sum': 0}
+    attraction_static = {}
+    P_o = {'top': {}, 'bottom_sum': 0}
+    attraction_static_occupancy = {}
+    attraction_final = {}
+    offset_sff_neighbourhood = np.full(shape=(5, 5), fill_value=float("inf"))
+    for pos in cells:
+        offset_cell = pos[1] - agent.pos[1] + 2, pos[0] - agent.pos[0] + 2
+        offset_sff_neighbourhood[offset_cell] = sff[pos[1], pos[0]]
+    offset_sff_neighbourhood -= offset_sff_neighbourhood[2, 2]
+    for pos in cells:
+        offset_cell = pos[1] - agent.pos[1] + 2, pos[0] - agent.pos[0] + 2
+        S = offset_sff_neighbourhood[offset_cell]
+        Occupy = 0
+        if agent.model.of[pos[1], pos[0]] == OCCUPIED_CELL:
+            Occupy = 1
+        D = int(agent.is_diagonal(pos))
+        P_s['top'][pos] = np.exp((-ks) * S) * (1 - kd * D)
+        P_s['bottom_sum'] += P_s['top'][pos]
+        P_o['top'][pos] = np.exp((-ks) * S) * (1 - Occupy) * (1 - kd * D)
+        P_o['bottom_sum'] += P_o['top'][pos]
+    for pos in cells:
+        attraction_static[pos] = P_s['top'][pos] / P_s['bottom_sum']
+        if P_o['bottom_sum'] == 0:
+            attraction_static_occupancy[pos] = 0
+        else:
+            attraction_static_occupancy[pos] = P_o['top'][pos] / P_o['bottom_sum']
+    for pos in cells:
+        attraction_final[pos] = ko * attraction_static_occupancy[pos] + (1 - ko) * attraction_static[pos]
+    return attraction_final
+
+
+def benchmark_attraction(map_name="map22.txt", n_steps=50, ko=0.5, kd=0.5, topology_folder="./maps/topology"):
+    # time per call of the 3x3 attraction kernel against the original implementation, same agents and fields
+    fl = FileLoader(os.path.abspath(os.path.join(topology_folder, map_name)))
+    model = RoomModel(ks=3.0, ko=ko, kd=kd, leader_movement_duration=2, agent_movement_duration=3,
+                      penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl, seed=0)
+    reference_time = 0
+    kernel_time = 0
+    n_calls = 0
+    diff = 0
+    for _ in range(n_steps):
+        model.step()
+        sff = model.sff["Follower"]
+        for agent in model.schedule.agents:
+            if agent.pos is None:
+                continue
+            cells = model.grid.get_neighborhood(agent.pos, moore=True, include_center=True)
+            start = time.perf_counter()
+            expected = attraction_reference(agent, sff, cells)
+            reference_time += time.perf_counter() - start
+            start = time.perf_counter()
+            kernel_cells, attraction = agent.moore_attraction(sff)
+            kernel_time += time.perf_counter() - start
+            n_calls += 1
+            if kernel_cells != list(expected.keys()):
+                raise ValueError("Kernel cells differ from the Moore neighbourhood.")
+            diff = max(diff, np.max(np.abs(attraction - np.array(list(expected.values())))))
+    print(map_name, "calls", n_calls, "reference %.1f us, 3x3 kernel %.1f us, speedup %.1fx, max diff %.0e" %
+          (1e6 * reference_time / n_calls, 1e6 * kernel_time / n_calls, reference_time / kernel_time, diff))
+
+
+def crowd_map(filename, n_agents, spacing=3):
+    # square room with a leader and n_agents followers on a lattice, spacing keeps them from pairing
+    side = int(np.ceil(np.sqrt(n_agents)))
+    size = side * spacing + 4
+    lines = [["#"] * size] + [["#"] + [" "] * (size - 2) + ["#"] for _ in range(size - 2)] + [["#"] * size]
+    lines[1][1] = "L"
+    for i in range(n_agents):
+        lines[3 + (i // side) * spacing][3 + (i % side) * spacing] = "D"
+    with open(filename, "w") as f:
+        f.writelines("".join(line) + "\n" for line in lines)
+        f.write("0\nE 1 1 All\n")
+
+
+def benchmark_decisions(n_agents_list=(25, 100, 400, 1600), n_ticks=5):
+    # decision phase of solitary agents at once against one by one, and the whole tick, for growing crowds
+    print("agents".rjust(7), "sequential ms".rjust(14), "batched ms".rjust(11), "speedup".rjust(8),
+          "tick seq ms".rjust(12), "tick batch ms".rjust(14))
+    for n_agents in n_agents_list:
+        with tempfile.TemporaryDirectory() as maps_folder:
+            filename = os.path.join(maps_folder, "topology", "crowd.txt")
+            os.makedirs(os.path.dirname(filename))
+            crowd_map(filename, n_agents)
+            with contextlib.redirect_stdout(io.StringIO()):
+                fl = FileLoader(filename, lazy=True)
+            times = {}
+            for batched in [False, True]:
+                model = RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=3,
+                                  penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl,
+                                  batched_decisions=batched, seed=0)
+                agents = [agent for agent in model.schedule.agents if agent.batched_decision]
+                start = time.perf_counter()
+                for _ in range(n_ticks):
+                    if batched:
+                        DirectedAgent.select_cells(model, agents)
+                    else:
+                        for agent in agents:
+                            agent.step()
+                    # forget the selection, the next round starts from the same state
+                    for cell in model.schedule.cells:
+                        cell.q = []
+                    model.schedule._cells = {}
+                times[batched] = (time.perf_counter() - start) / n_ticks
+                start = time.perf_counter()
+                for _ in range(n_ticks):
+                    model.step()
+                times[batched, "tick"] = (time.perf_counter() - start) / n_ticks
+        print(str(n_agents).rjust(7), ('%.2f' % (1000 * times[False])).rjust(14),
+              ('%.2f' % (1000 * times[True])).rjust(11), ('%.1f' % (times[False] / times[True])).rjust(8),
+              ('%.2f' % (1000 * times[False, "tick"])).rjust(12), ('%.2f' % (1000 * times[True, "tick"])).rjust(14))
+
+
+def maneuver_attraction_reference(agent, sff):
+    # original implementation of DirectedPartnerAgent.attraction, a loop over maneuvers with dicts
+    width, height = agent.model.dimensions
+    maneuvers = []
+    for (leader_offset, leader_orientation), (partner_offset, partner_orientation), _ in MANEUVERS[agent.orientation]:
+        leader_move = agent.pos[0] + leader_offset[0], agent.pos[1] + leader_offset[1]
+        partner_move = agent.pos[0] + partner_offset[0], agent.pos[1] + partner_offset[1]
+        if 0 <= leader_move[0] < width and 0 <= leader_move[1] < height and \
+                0 <= partner_move[0] < width and 0 <= partner_move[1] < height:
+            maneuvers.append(((leader_move, leader_orientation), (partner_move, partner_orientation)))
+    leader_attraction = attraction_reference(agent, sff, [leader[0] for leader, _ in maneuvers])
+    partner_attraction = attraction_reference(agent.partner, sff, [partner[0] for _, partner in maneuvers])
+    attraction = {}
+    for leader, partner in maneuvers:
+        penalization = 0
+        if agent.cross_obstacle(leader[0]) or agent.partner.cross_obstacle(partner[0]):
+            penalization = agent.penalization_cross_obstacle
+        if leader_attraction[leader[0]] == 0 or partner_attraction[partner[0]] == 0:
+            attraction[(leader, partner)] = 0
+        else:
+            attraction[(leader, partner)] = (1 - penalization) * (leader_attraction[leader[0]] +
+                                                                  partner_attraction[partner[0]])
+    top_maneuver = (float("-inf"), None)
+    for key in attraction:
+        if attraction[key] > top_maneuver[0]:
+            top_maneuver = (attraction[key], key)
+    top_orientation = top_maneuver[1][0][1]
+    distance_to_leader = min(agent.leader_dist(), agent.partner.leader_dist())
+    incorrect_orientation_penalization = 0
+    if distance_to_leader > 0:
+        incorrect_orientation_penalization = ((1 / distance_to_leader) ** 0.5) * agent.penalization_orientation
+    for key in attraction:
+        penalization = 0
+        if key[0][1] != top_orientation:
+            penalization = incorrect_orientation_penalization
+        attraction[key] = attraction[key] * (1 - penalization)
+    normalize = sum(attraction.values())
+    for key in attraction:
+        attraction[key] /= normalize
+    return attraction
+
+
+def benchmark_maneuvers(map_name="map22.txt", n_steps=100, ko=0.5, kd=0.5, topology_folder="./maps/topology"):
+    # time per call of the pair maneuver attraction on compiled tables against the original loop over maneuvers
+    with contextlib.redirect_stdout(io.StringIO()):
+        fl = FileLoader(os.path.abspath(os.path.join(topology_folder, map_name)))
+    model = RoomModel(ks=3.0, ko=ko, kd=kd, leader_movement_duration=2, agent_movement_duration=3,
+                      penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl, seed=0)
+    reference_time = 0
+    compiled_time = 0
+    n_calls = 0
+    diff = 0
+    for _ in range(n_steps):
+        model.step()
+        sff = model.sff["Follower"]
+        for agent in model.schedule.agents:
+            # the leader of the pair decides for both, same as in step
+            if getattr(agent, "partner", None) is None or agent.pos is None or not agent.update_leader():
+                continue
+            start = time.perf_counter()
+            expected = maneuver_attraction_reference(agent, sff)
+            reference_time += time.perf_counter() - start
+            start = time.perf_counter()
+            _, _, attraction = agent.maneuver_attraction(sff)
+            compiled_time += time.perf_counter() - start
+            n_calls += 1
+            diff = max(diff, np.max(np.abs(attraction - np.array(list(expected.values())))))
+    print(map_name, "pair calls", n_calls, "reference %.1f us, compiled tables %.1f us, speedup %.1fx, max diff %.0e" %
+          (1e6 * reference_time / n_calls, 1e6 * compiled_time / n_calls, reference_time / compiled_time, diff))
+
+
+def benchmark_leader_distances(n_agents_list=(25, 100, 400, 1600), n_ticks=20):
+    # distance to leader and discipline of all agents in a tick, one lookup per call against the snapshot of the tick
+    print("agents".rjust(7), "per call ms".rjust(12), "snapshot ms".rjust(12), "speedup".rjust(8), "max diff".rjust(9))
+    for n_agents in n_agents_list:
+        with tempfile.TemporaryDirectory() as maps_folder:
+            filename = os.path.join(maps_folder, "topology", "crowd.txt")
+            os.makedirs(os.path.dirname(filename))
+            crowd_map(filename, n_agents)
+            with contextlib.redirect_stdout(io.StringIO()):
+                fl = FileLoader(filename, lazy=True)
+            model = RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=3,
+                              penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl, seed=0)
+            agents = [agent for agent in model.schedule.agents if agent.pos is not None]
+            per_call_time = 0
+            snapshot_time = 0
+            diff = 0
+            for _ in range(n_ticks):
+                model.leader_distances = {}
+                start = time.perf_counter()
+                expected = [(agent.leader_dist(), agent.discipline()) for agent in agents]
+                per_call_time += time.perf_counter() - start
+                start = time.perf_counter()
+                model.leader_distances_update()
+                values = [(agent.leader_dist(), agent.discipline()) for agent in agents]
+                snapshot_time += time.perf_counter() - start
+                diff = max(diff, np.max(np.abs(np.array(values) - np.array(expected))))
+                model.step()
+                agents = [agent for agent in model.schedule.agents if agent.pos is not None]
+        print(str(n_agents).rjust(7), ('%.2f' % (1000 * per_call_time / n_ticks)).rjust(12),
+              ('%.2f' % (1000 * snapshot_time / n_ticks)).rjust(12),
+              ('%.1f' % (per_call_time / snapshot_time)).rjust(8), ('%.0e' % diff).rjust(9))
+
+
+def allow_entrance_reference(agent):
+    # original Agent.allow_entrance, agents with tau not after the timestep move, pairs only together
+    if agent.tau <= agent.model.schedule.time:
+        if agent.partner is not None:
+            if agent.partner.tau > agent.model.schedule.time:
+                return False
+        return True
+    else:
+        return False
+
+
+def allowed_columns(states, time):
+    # allow_entrance_reference of all rows of states at once
+    tau = states.tau[:states.size]
+    partner = states.partner[:states.size]
+    # -1 of solitary agents picks the last row, it is masked out
+    return (tau <= time) & ((partner < 0) | (tau[partner] <= time))
+
+
+def benchmark_entrance(n_agents_list=(25, 100, 400, 1600), n_ticks=20):
+    # agents allowed to enter a tick, one allow_entrance_reference per agent against one pass over the columns of states
+    print("agents".rjust(7), "per agent ms".rjust(13), "columns ms".rjust(11), "speedup".rjust(8), "mismatch".rjust(9))
+    for n_agents in n_agents_list:
+        with tempfile.TemporaryDirectory() as maps_folder:
+            filename = os.path.join(maps_folder, "topology", "crowd.txt")
+            os.makedirs(os.path.dirname(filename))
+            crowd_map(filename, n_agents)
+            with contextlib.redirect_stdout(io.StringIO()):
+                fl = FileLoader(filename, lazy=True)
+            model = RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=3,
+                              penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl, seed=0)
+            per_agent_time = 0
+            columns_time = 0
+            mismatch = 0
+            for _ in range(n_ticks):
+                agents = model.schedule.agents
+                start = time.perf_counter()
+                expected = [agent.unique_id for agent in agents if allow_entrance_reference(agent)]
+                per_agent_time += time.perf_counter() - start
+                start = time.perf_counter()
+                allowed = allowed_columns(model.schedule.states, model.schedule.time).tolist()
+                values = [agent.unique_id for agent in agents if allowed[agent.row]]
+                columns_time += time.perf_counter() - start
+                mismatch += values != expected
+                model.step()
+        print(str(n_agents).rjust(7), ('%.3f' % (1000 * per_agent_time / n_ticks)).rjust(13),
+              ('%.3f' % (1000 * columns_time / n_ticks)).rjust(11),
+              ('%.1f' % (per_agent_time / columns_time)).rjust(8), str(mismatch).rjust(9))
+
+
+def benchmark_scheduler(n_agents_list=(100, 400, 1600), durations=(3, 12), n_ticks=40):
+    # cost of a tick against the share of agents due in it, slow agents leave most ticks idle
+    print("agents".rjust(7), "duration".rjust(9), "due %".rjust(6), "idle %".rjust(7), "tick ms".rjust(8),
+          "us per due".rjust(11))
+    for n_agents in n_agents_list:
+        with tempfile.TemporaryDirectory() as maps_folder:
+            filename = os.path.join(maps_folder, "topology", "crowd.txt")
+            os.makedirs(os.path.dirname(filename))
+            crowd_map(filename, n_agents)
+            with contextlib.redirect_stdout(io.StringIO()):
+                fl = FileLoader(filename, lazy=True)
+            for duration in durations:
+                model = RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=duration,
+                                  penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl,
+                                  seed=0)
+                schedule = model.schedule
+                step_time = 0
+                n_due = 0
+                n_idle = 0
+                for _ in range(n_ticks):
+                    due = len(schedule.states.due(schedule.time))
+                    n_due += due
+                    n_idle += due == 0
+                    start = time.perf_counter()
+                    model.step()
+                    step_time += time.perf_counter() - start
+                share = n_due / (n_ticks * len(schedule.agents))
+                print(str(n_agents).rjust(7), str(duration).rjust(9), ('%.0f' % (100 * share)).rjust(6),
+                      ('%.0f' % (100 * n_idle / n_ticks)).rjust(7), ('%.2f' % (1000 * step_time / n_ticks)).rjust(8),
+                      ('%.1f' % (1e6 * step_time / max(n_due, 1))).rjust(11))
+
+
+if __name__ == '__main__':
+    # run in the same folder as setup.py
+    benchmark_static_field()
+    benchmark_quantization()
+    benchmark_pairwise()
+    benchmark_landmarks()
+    benchmark_hierarchical()
+    benchmark_wavefront()
+    benchmark_first_step()
+    benchmark_attraction()
+    benchmark_decisions()
+    benchmark_maneuvers()
+    benchmark_leader_distances()
+    benchmark_entrance()
+    benchmark_scheduler()
@@ -1,14 +1,48 @@
 import mesa
 import numpy as np
 
-from .utils.portrayal import create_color
-from .utils.constants import SFF_OBSTACLE, KS, KO, KD, GAMMA, OCCUPIED_CELL, EMPTY_CELL
+from .utils.portrayal import create_color, rgb_to_hex
+from .utils.constants import AGENT_KIND, KS, KO, KD, GAMMA, OCCUPIED_CELL, EMPTY_CELL, MOORE_DIAGONAL
 from .utils.algorithms import dist
 
 
+def attraction_probabilities(S, occupied, diagonal, ks, ko, kd):
+    """Attraction of cells from their SFF relative to the agent's cell, occupancy and diagonal moves.
+
+    Cells are along the last axis, leading axes are agents with their own parameters.
+
+    Args:
+        S (object): np.array(..., n) of float relative SFF values.
+        occupied (object): np.array(..., n) of bool, the cell is occupied.
+        diagonal (object): np.array(..., n) of bool or int, the move to the cell is diagonal.
+        ks (float): Sensitivity to SFF with discipline, np.array(..., 1) for more agents.
+        ko (float): Sensitivity to occupied cells, np.array(..., 1) for more agents.
+        kd (float): Sensitivity to diagonal movement, np.array(..., 1) for more agents.
+
+    Returns:
+        np.array(..., n) of float attraction.
+
+    """
+    # mixing P_s and P_o based od ko sensitivity, notice the missing occupancy factor in P_s
+    P_s = np.exp((-ks) * S) * (1 - kd * diagonal)
+    P_o = P_s * ~occupied
+    # sums accumulate in the order of cells
+    bottom_sum_s = np.cumsum(P_s, axis=-1)[..., -1:]
+    bottom_sum_o = np.cumsum(P_o, axis=-1)[..., -1:]
+    attraction_static = P_s / bottom_sum_s
+    # without a free cell only the static part remains
+    free = bottom_sum_o != 0
+    attraction_static_occupancy = P_o / np.where(free, bottom_sum_o, 1)
+    return np.where(free, ko * attraction_static_occupancy + (1 - ko) * attraction_static,
+                    (1 - ko) * attraction_static)
+
+
 class Agent(mesa.Agent):
     """Base (abstract) class for physical agent moving on grid.
 
+    Position, tau, movement duration and partner are a view over the row of the agent in the columns of
+    model.schedule.states (AgentStates). Position and partner are also kept in the object for fast access.
+
     Attributes:
         name (str): Human readable name of agent with characterization.
         color (str): HTML Hex code of color.
@@ -22,12 +56,26 @@ class Agent(mesa.Agent):
         tau (int): Timestep after move.
         movement_duration (int): Duration of a normal move.
         k (dict): Parameters which affect attraction calculation.
+        states (AgentStates): Columns of state of all agents.
+        row (int): Row of the agent in states.
+        kind (AGENT_KIND): Kind of the agent, decides behaviour instead of the name.
+        batched_decision (bool): Agent selects next cell together with others of its class in the scheduler.
     """
+    __slots__ = ("states", "row", "_pos", "_partner", "name", "color", "head", "tail", "cell", "next_cell",
+                 "confirm_move", "moved", "nominal_movement_duration", "penalization_orientation",
+                 "penalization_cross_obstacle", "k")
+    kind = AGENT_KIND.CELL
+    batched_decision = False
 
     def __init__(self, uid, model):
+        # the row must exist before mesa sets the position
+        self.states = model.schedule.states
+        self.row = self.states.allocate(self)
+        self.states.kind[self.row] = self.kind
         super().__init__(uid, model)
         self.name = str(uid)
-        self.color = create_color(self)
+        # new agents are black, create_color recolours pairs when they form or split
+        self.color = rgb_to_hex(0, 0, 0)
         self.head = None
         self.tail = None
         self.cell = None
@@ -45,6 +93,43 @@ class Agent(mesa.Agent):
                   KD: self.model.kd,
                   GAMMA: 0.1}
 
+    @property
+    def pos(self):
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos):
+        self._pos = pos
+        if pos is None:
+            pos = -1, -1
+        self.states.x[self.row], self.states.y[self.row] = pos
+
+    @property
+    def partner(self):
+        return self._partner
+
+    @partner.setter
+    def partner(self, partner):
+        self._partner = partner
+        self.states.partner[self.row] = -1 if partner is None else partner.row
+
+    @property
+    def tau(self):
+        return int(self.states.tau[self.row])
+
+    @tau.setter
+    def tau(self, tau):
+        self.states.tau[self.row] = tau
+        self.states.wake(self.row, tau)
+
+    @property
+    def movement_duration(self):
+        return int(self.states.movement_duration[self.row])
+
+    @movement_duration.setter
+    def movement_duration(self, movement_duration):
+        self.states.movement_duration[self.row] = movement_duration
+
     def __repr__(self):
         return self.name + " " + str(self.pos)
 
@@ -55,8 +140,7 @@ class Agent(mesa.Agent):
     def dist(self, goal, start=None):
         if start is None:
             start = self.pos
-        sff = self.model.sff[goal]
-        return sff[start[1], start[0]]
+        return self.model.sff.distance(goal, start)
 
     def path_dist(self, goal, start=None):
         """Path distance from start to goal. If start is None, use agent pos.
@@ -68,18 +152,34 @@ class Agent(mesa.Agent):
         """
         if start is None:
             start = self.pos
-        sff = self.model.sff["Gate"]
-        d = sff[start[1], start[0]] - sff[goal[1], goal[0]]
+        d = self.model.sff.distance("Gate", start) - self.model.sff.distance("Gate", goal)
         return abs(d)
 
     def leader_dist(self, start=None):
+        """Path distance from start to the leader. If start is None, use agent pos resolved at the start of the tick.
+
+        Args:
+            start Tuple[int,int]: xy coordinates of start position.
+
+        """
         if start is None:
+            snapshot = self.leader_snapshot()
+            if snapshot is not None:
+                return snapshot[1]
             start = self.pos
-        goal = self.model.gate
-        if self.model.leader.pos is not None:
-            goal = self.model.leader.pos
-        sff = self.model.sff[goal]
-        return sff[start[1], start[0]]
+        return self.model.sff.distance(self.model.leader_goal(), start)
+
+    def leader_snapshot(self):
+        """Values of the agent resolved by model.leader_distances_update, None if the agent or the leader moved since.
+
+        Returns:
+            ((int, int), float, float): xy coordinates, distance to leader and discipline.
+
+        """
+        snapshot = self.model.leader_distances.get(self.unique_id)
+        if snapshot is None or snapshot[0] != self.pos or self.model.leader_distances_goal != self.model.leader_goal():
+            return None
+        return snapshot
 
     def reset(self):
         """Reset state variables of the agent."""
@@ -99,14 +199,41 @@ class Agent(mesa.Agent):
             sff np.array(height, width):  Array of float static field values.
 
         """
-        cells = self.model.grid.get_neighborhood(self.pos, moore=True, include_center=True)
-        attraction = self.attraction(sff, cells)
-        coords = self.stochastic_choice(attraction)
+        cells, attraction = self.moore_attraction(sff)
+        idx = self.stochastic_index(attraction)
+        coords = self.pos if idx is None else cells[idx]
         cell = self.model.grid[coords[0]][coords[1]][0]
         self.next_cell = cell
         cell.enter(self)
         return cell
 
+    def moore_attraction(self, sff):
+        """Calculate attraction of each position in the Moore neighbourhood of the agent including its cell.
+
+        Same as attraction of the cells of get_neighborhood(self.pos, moore=True, include_center=True)
+        computed on 3x3 windows of sff and occupancy around the agent.
+
+        Args:
+            sff (object):  np.array(height, width) of float static field values.
+
+        Returns:
+            (list, np.array): xy coordinates of cells in the order of get_neighborhood (x-major)
+            and their attraction.
+
+        """
+        x, y = self.pos
+        height, width = sff.shape
+        # the window is cut at the borders of the grid, same as the neighbourhood
+        left, right = max(0, x - 1), min(width, x + 2)
+        bottom, top = max(0, y - 1), min(height, y + 2)
+        # transposed windows are x-major
+        window = sff[bottom:top, left:right].T
+        occupied = self.model.of[bottom:top, left:right].T == OCCUPIED_CELL
+        diagonal = MOORE_DIAGONAL[bottom - y + 1:top - y + 1, left - x + 1:right - x + 1].T
+        cells = [(nx, ny) for nx in range(left, right) for ny in range(bottom, top)]
+        attraction = self.attraction_probabilities(window.ravel() - sff[y, x], occupied.ravel(), diagonal.ravel())
+        return cells, attraction
+
     def attraction(self, sff, cells):
         """Calculate attraction of each position in cells based on sff etc.
 
@@ -118,59 +245,58 @@ class Agent(mesa.Agent):
             dict: xy coordinates(key) and attraction(value).
 
         """
-        ks = self.k[KS]
-        ko = self.k[KO]
-        kd = self.k[KD]
+        xs = np.array([x for x, _ in cells])
+        ys = np.array([y for _, y in cells])
+        return dict(zip(cells, self.cells_attraction(sff, xs, ys)))
+
+    def cells_attraction(self, sff, xs, ys):
+        """Calculate attraction of cells given by arrays of coordinates, repeated cells count in normalization.
+
+        Args:
+            sff (object):  np.array(height, width) of float static field values.
+            xs (object): np.array(n) of int x coordinates.
+            ys (object): np.array(n) of int y coordinates.
 
+        Returns:
+            np.array(n) of float attraction.
+
+        """
+        x, y = self.pos
+        # SFF relative to the cell of the agent, inf if the agent's cell is not among cells
+        center = sff[y, x] if np.any((xs == x) & (ys == y)) else float("inf")
+        diagonal = (xs != x) & (ys != y)
+        occupied = self.model.of[ys, xs] == OCCUPIED_CELL
+        return self.attraction_probabilities(sff[ys, xs] - center, occupied, diagonal)
+
+    def discipline(self):
+        """Discipline of the agent, which is higher close to the leader."""
+        snapshot = self.leader_snapshot()
+        if snapshot is not None:
+            return snapshot[2]
         # discipline calculation based on distance to leader
         discipline = 1
         distance_to_leader = self.leader_dist()
-        if self.name.startswith("Follower") and distance_to_leader > 0:
+        if self.kind.is_follower() and distance_to_leader > 0:
             discipline += 1 / distance_to_leader
+        return discipline
 
-        ks = self.k[KS] * discipline
-
-        # mixing P_s and P_o based od ko sensitivity
-        P_s = {'top': {}, 'bottom_sum': 0}
-        attraction_static = {}
-        P_o = {'top': {}, 'bottom_sum': 0}
-        attraction_static_occupancy = {}
-        # results
-        attraction_final = {}
-
-        offset_sff_neighbourhood = np.full(shape=(5, 5), fill_value=float("inf"))
-        for pos in cells:
-            offset_cell = pos[1] - self.pos[1] + 2, pos[0] - self.pos[0] + 2
-            offset_sff_neighbourhood[offset_cell] = sff[pos[1], pos[0]]
-        offset_sff_neighbourhood -= offset_sff_neighbourhood[2, 2]
-        for pos in cells:
-            offset_cell = pos[1] - self.pos[1] + 2, pos[0] - self.pos[0] + 2
-            S = offset_sff_neighbourhood[offset_cell]
-            # self.model.logger.debug(str(discipline)+str(distance_to_leader)+str(S)+str(ks)+str(self.k[KS]))
-            # O is 0 or 1
-            Occupy = 0
-            if self.model.of[pos[1], pos[0]] == OCCUPIED_CELL:
-                Occupy = 1
-            # D is 0 or 1
-            D = int(self.is_diagonal(pos))
-            # notice the missing occupancy factor (ko and Occupy)
-            P_s['top'][pos] = np.exp((-ks) * S) * (1 - kd * D)
-            P_s['bottom_sum'] += P_s['top'][pos]
-            # notice the missing ko parameter
-            P_o['top'][pos] = np.exp((-ks) * S) * (1 - Occupy) * (1 - kd * D)
-            P_o['bottom_sum'] += P_o['top'][pos]
-
-        for pos in cells:
-            attraction_static[pos] = P_s['top'][pos] / P_s['bottom_sum']
-            if P_o['bottom_sum'] == 0:
-                attraction_static_occupancy[pos] = 0
-            else:
-                attraction_static_occupancy[pos] = P_o['top'][pos] / P_o['bottom_sum']
+    def static_sensitivity(self):
+        """Sensitivity to SFF kS increased by discipline."""
+        return self.k[KS] * self.discipline()
 
-        # normalize
-        for pos in cells:
-            attraction_final[pos] = ko * attraction_static_occupancy[pos] + (1 - ko) * attraction_static[pos]
-        return attraction_final
+    def attraction_probabilities(self, S, occupied, diagonal):
+        """Attraction of cells from their SFF relative to the agent's cell, occupancy and diagonal moves.
+
+        Args:
+            S (object): np.array(n) of float relative SFF values.
+            occupied (object): np.array(n) of bool, the cell is occupied.
+            diagonal (object): np.array(n) of bool or int, the move to the cell is diagonal.
+
+        Returns:
+            np.array(n) of float attraction.
+
+        """
+        return attraction_probabilities(S, occupied, diagonal, self.static_sensitivity(), self.k[KO], self.k[KD])
 
     def stochastic_choice(self, attraction):
         """Pick xy coordinates stochastically based on probability in attraction.
@@ -183,21 +309,31 @@ class Agent(mesa.Agent):
 
         """
         coords = list(attraction.keys())
-        probabilities = list(attraction.values())
-        norm = sum(probabilities)
-        if norm == 0 or norm == np.inf or norm == -np.inf or np.isnan(norm):
+        idx = self.stochastic_index(list(attraction.values()))
+        if idx is None:
             if self.partner:
                 return (self.pos, self.orientation), (self.partner.pos, self.orientation)
             else:
                 return self.pos
-        probabilities = probabilities / norm
-        idx = np.random.choice(len(coords), p=probabilities)
 
         choice_pos = coords[idx]
         if self.partner is not None:
             self.model.datacollector.incorrect_orientation_selected(self.unique_id, choice_pos)
         return choice_pos
 
+    def stochastic_index(self, probabilities):
+        """Index picked stochastically based on probabilities, None if they can not be normalized.
+
+        Inverse CDF of the next uniform number of the model, same as in DirectedAgent.select_cells.
+
+        """
+        norm = sum(probabilities)
+        if norm == 0 or norm == np.inf or norm == -np.inf or np.isnan(norm):
+            return None
+        cdf = np.cumsum(np.asarray(probabilities) / norm)
+        cdf /= cdf[-1]
+        return int(np.count_nonzero(cdf <= self.model.uniforms.random()))
+
     def deterministic_choice(self, attraction):
         coords = list(attraction.keys())
         probabilities = list(attraction.values())
@@ -305,24 +441,6 @@ class Agent(mesa.Agent):
             if self.next_cell.agent is None:
                 self.movement_duration = round(self.nominal_movement_duration - self.movement_duration * 1/d)
 
-    def allow_entrance(self):
-        """Indicator of agent allowed to move in timestep.
-
-        Schedule runs in 2 ticks per update. Agents with tau lower
-        than timestep are allowed to move.
-
-        Returns:
-            bool: Agent can move in the next timestep.
-
-        """
-        if self.tau <= self.model.schedule.time:
-            if self.partner is not None:
-                if self.partner.tau > self.model.schedule.time:
-                    return False
-            return True
-        else:
-            return False
-
     def cross_obstacle(self, pos):
         """Indicator of crossing obstacle.
 
@@ -333,24 +451,7 @@ class Agent(mesa.Agent):
             bool: Agent crosses obstacle.
 
         """
-        # non diagonal movement
-        if not self.is_diagonal(pos):
-            return False
-        corners = []
-        if self.pos[0] < pos[0]:
-            corners.append((self.pos[0] + 1, self.pos[1]))
-        else:
-            corners.append((self.pos[0] - 1, self.pos[1]))
-
-        if self.pos[1] < pos[1]:
-            corners.append((self.pos[0], self.pos[1] + 1))
-        else:
-            corners.append((self.pos[0], self.pos[1] - 1))
-
-        for x, y in corners:
-            if self.model.sff["Follower"][y][x] == SFF_OBSTACLE:
-                return True
-        return False
+        return self.model.walkability.cross_obstacle(self.pos, pos)
 
     def is_diagonal(self, pos, agent_pos=None):
         """Indicator of diagonal movement. Can be outside Moore neighbourhood.
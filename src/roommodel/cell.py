@@ -2,25 +2,32 @@ import mesa
 import numpy as np
 
 
-from .agent import Agent
 from .utils.portrayal import rgb_to_hex
-from .utils.constants import EMPTY_CELL
+from .utils.constants import AGENT_KIND, EMPTY_CELL
 
 
-class Cell(Agent):
+class Cell(mesa.Agent):
     """Grid cell class in which agents move.
 
+    Cells are never scheduled as agents, so they keep no row in the agent states and no wakeup.
+
     Attributes:
         name (str): Human readable name with coords.
+        color (str): HTML Hex code of color.
         coords (int, int): xy coordinates in the grid.
         agent (object): Agent occupying this cell.
         winner (object): Agent which can enter this cell in the next step.
         q (list): List of agents that want to enter this cell.
 
     """
+    __slots__ = ("name", "color", "coords", "agent", "winner", "q")
+    kind = AGENT_KIND.CELL
+
     def __init__(self, uid: int, model: mesa.Model, coords: (int, int)):
         super().__init__(uid, model)
-        self.name = "Cell: " + self.name
+        self.name = "Cell: " + str(uid)
+        # cells are black until update_color
+        self.color = rgb_to_hex(0, 0, 0)
         self.coords = coords
         self.agent = None
         self.winner = None
@@ -29,7 +36,8 @@ class Cell(Agent):
     def step(self):
         """Cell selects winner from q and updates its bounds to head and tail."""
         if len(self.q) > 0:
-            self.winner = np.random.permutation(self.q)[0]
+            # uniformly random agent of the competitors
+            self.winner = self.q[int(self.model.uniforms.random() * len(self.q))]
             self.q = []
             if self.agent is not None:
                 # do not create cycle with the same agent
@@ -45,6 +53,9 @@ class Cell(Agent):
                 if head.next_cell.winner is head:
                     head.move()
 
+    def __repr__(self):
+        return self.name + " " + str(self.pos)
+
     def bubbleup(self):
         """Iterate bonds to the front until unbounded agent or cycle is found - break cycle."""
         head = self.winner
@@ -88,7 +99,7 @@ class Cell(Agent):
         if not self.agent:
             raise ValueError("Empty evacuation.")
         # statistics, todo
-        if self.agent.name.startswith("Follower"):
+        if self.agent.kind.is_follower():
             self.model.n_evacuated_followers += 1
         else:
             self.model.n_evacuated_leaders += 1
@@ -99,7 +110,7 @@ class Cell(Agent):
 
         self.model.grid.remove_agent(self.agent)
         self.model.schedule.remove_agent(self.agent)
-        if self.agent.name.startswith("Leader"):
+        if self.agent.kind == AGENT_KIND.LEADER:
             self.agent.pos = self.pos
         # evacuation is in the moment of entrance so it is different from self.cell.leave()
         self.model.of[self.pos[1], self.pos[0]] = EMPTY_CELL
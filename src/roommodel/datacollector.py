@@ -82,6 +82,10 @@ class RoomDataCollector(mesa.DataCollector):
             self.data[key] = {}
         return self.data[key]
 
+    def tracks_incorrect_orientation(self):
+        """Indicator of any experiment collecting incorrect orientations of pairs."""
+        return any(e.name == ExperimentIncorrectOrientation.__name__ for e in self.experiments)
+
     def incorrect_orientation(self, uid, cells):
         for e in self.experiments:
             if e.name == ExperimentIncorrectOrientation.__name__:
@@ -1,8 +1,8 @@
 import mesa
 import numpy as np
 
-from .agent import Agent
-from .utils.constants import ORIENTATION, KO, KS
+from .agent import Agent, attraction_probabilities
+from .utils.constants import AGENT_KIND, ORIENTATION, ORIENTATIONS, KO, KS, KD, OCCUPIED_CELL, MOORE_DIAGONAL
 
 
 class DirectedAgent(Agent):
@@ -10,16 +10,30 @@ class DirectedAgent(Agent):
 
     Attributes:
         name (str): Human readable name of agent with characterization.
-        orientation (ORIENTATION): Orientation of agent in 4 cardinal directions (North, East, South, West).
+        orientation (ORIENTATION): Orientation of agent in 4 cardinal directions (North, East, South, West),
+            a view over states.orientation.
         next_orientation (ORIENTATION): Orientation after successful move to next_cell.
+        batched_decision (bool): Solitary agents select next_cell together in select_cells.
 
     """
+    __slots__ = ("next_orientation",)
+    kind = AGENT_KIND.FOLLOWER
+    batched_decision = True
+
     def __init__(self, uid, model):
         super().__init__(uid, model)
         self.name = "Follower " + self.name
         self.orientation = ORIENTATION.NORTH
         self.next_orientation = ORIENTATION.NORTH
 
+    @property
+    def orientation(self):
+        return ORIENTATIONS[self.states.orientation[self.row]]
+
+    @orientation.setter
+    def orientation(self, orientation):
+        self.states.orientation[self.row] = orientation
+
     def __repr__(self):
         return self.name + " " + str(self.pos) + " " + str(self.orientation)
 
@@ -29,10 +43,75 @@ class DirectedAgent(Agent):
         # follows SFF set by Leader
         sff = self.model.sff["Follower"]
         self.select_cell(sff)
-        # compute orientation after move
+        self.turn()
+
+    def turn(self):
+        """Compute orientation after move to next_cell."""
         if self.next_cell:
             self.next_orientation, shift = self.orientation.twist(self.pos, self.next_cell.pos)
 
+    @staticmethod
+    def select_cells(model, agents):
+        """Step of solitary agents at once, each agent selects next_cell same as in select_cell.
+
+        Attraction of the Moore neighbourhoods of all agents is computed in one pass over
+        np.array(n_agents, 9) and the cells are sampled by inverse CDF with one uniform number
+        per agent, taken at once from model.uniforms. Agents then enter the competition for the cells in order.
+        Agents at the border of the grid have cut neighbourhoods and step one by one.
+
+        Args:
+            model (RoomModel): Model of the agents.
+            agents (list): Solitary DirectedAgents allowed to move.
+
+        """
+        sff = model.sff["Follower"]
+        height, width = sff.shape
+        inner = []
+        for agent in agents:
+            x, y = agent.pos
+            if 0 < x < width - 1 and 0 < y < height - 1:
+                agent.reset()
+                inner.append(agent)
+            else:
+                agent.step()
+        if not inner:
+            return
+        positions = [agent.pos for agent in inner]
+        # coordinates straight from the columns of the agent states
+        states = model.schedule.states
+        rows = np.array([agent.row for agent in inner])
+        xs = states.x[rows][:, np.newaxis]
+        ys = states.y[rows][:, np.newaxis]
+        # Moore offsets in x-major order of get_neighborhood
+        dx = np.repeat([-1, 0, 1], 3)
+        dy = np.tile([-1, 0, 1], 3)
+        S = sff[ys + dy, xs + dx] - sff[ys, xs]
+        occupied = model.of[ys + dy, xs + dx] == OCCUPIED_CELL
+        diagonal = MOORE_DIAGONAL[dy + 1, dx + 1]
+        # discipline of each agent based on distance to leader, same as static_sensitivity
+        goal = model.gate if model.leader.pos is None else model.leader.pos
+        distance_to_leader = model.sff.distances(goal, positions)
+        disciplined = states.followers(rows) & (distance_to_leader > 0)
+        discipline = np.where(disciplined, 1 + 1 / np.where(disciplined, distance_to_leader, 1), 1)
+        ks = np.array([agent.k[KS] for agent in inner]) * discipline
+        ko = np.array([agent.k[KO] for agent in inner])
+        kd = np.array([agent.k[KD] for agent in inner])
+        attraction = attraction_probabilities(S, occupied, diagonal, ks[:, np.newaxis], ko[:, np.newaxis],
+                                              kd[:, np.newaxis])
+        # agents which can not normalize attraction stay, same as stochastic_index
+        norm = np.cumsum(attraction, axis=1)[:, -1]
+        valid = np.isfinite(norm) & (norm != 0)
+        cdf = np.cumsum(attraction[valid] / norm[valid, np.newaxis], axis=1)
+        cdf /= cdf[:, -1:]
+        # index of the agent's own cell
+        choices = np.full(shape=len(inner), fill_value=4)
+        choices[valid] = np.count_nonzero(cdf <= model.uniforms.random_sample(len(cdf))[:, np.newaxis], axis=1)
+        for agent, (x, y), idx in zip(inner, positions, choices.tolist()):
+            cell = model.grid._grid[x + dx[idx]][y + dy[idx]][0]
+            agent.next_cell = cell
+            cell.enter(agent)
+            agent.turn()
+
     def move(self):
         self.orientation = self.next_orientation
         return super().move()
@@ -12,7 +12,7 @@ import matplotlib.animation as animation
 
 import ffmpeg
 
-from .utils.constants import SFF_OBSTACLE, KS, KO, KD, GAMMA, OCCUPIED_CELL, EMPTY_CELL
+from .utils.constants import AGENT_KIND, FOLLOWER_KINDS, SFF_OBSTACLE, KS, KO, KD, GAMMA, OCCUPIED_CELL, EMPTY_CELL
 
 FIGSIZESQUARE = (8, 8)
 FIGSIZEWIDE = (20, 5)
@@ -147,11 +147,10 @@ class ExperimentDistanceToLeader(Experiment):
             self.data[key] = {uid: [] for uid in self.model.schedule.get_agents()}
         data = self.data[key]
 
-        for agent in self.model.schedule.agents:
-            if agent.name.startswith("Follower"):
-                uid = agent.unique_id
-                d_to_leader = agent.leader_dist()
-                data[uid].append(d_to_leader)
+        for agent in self.model.schedule.agents_of(*FOLLOWER_KINDS):
+            uid = agent.unique_id
+            d_to_leader = agent.leader_dist()
+            data[uid].append(d_to_leader)
         self.data[key] = data
 
     def visualize(self, save=False, show=False):
@@ -241,7 +240,7 @@ class ExperimentGaps(Experiment):
         data = self.data[key]
         if len(event_data) == 1:
             ctr = 0
-            for agent in self.model.schedule.agents:
+            for agent in self.model.schedule.agents_of(AGENT_KIND.FOLLOWER_PAIR):
                 if agent.partner is not None:
                     if agent.leader:
                         uid = agent.unique_id
@@ -0,0 +1,706 @@
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from .utils.cache import LRUCache
+from .utils.room import compute_source_field, compute_target_distances, find_doors, label_regions, \
+    region_distances, DIAGONAL_PRICE
+from .utils.constants import SFF_OBSTACLE, SFF_QUANTIZATION_STEP, SFF_QUANTIZED_OBSTACLE, SFF_STORAGE_TYPES
+
+
+def write_atomic(path, write):
+    """Write a file through a temporary file in the same folder which then replaces path.
+
+    Concurrent readers see either no file or the complete file, never a partly written one.
+
+    Args:
+        path (str): Path of the file.
+        write (callable): Writes the content to the binary file object it is called with.
+
+    """
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        # opened by path, so the writer can also open the file by f.name, e.g. as np.memmap
+        with open(temporary_path, "wb") as f:
+            write(f)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def save_array(path, array):
+    """Save np.array to .npy file atomically, see write_atomic."""
+    write_atomic(path, lambda f: np.save(f, array))
+
+
+def save_array_chunks(path, shape, dtype, chunks):
+    """Save np.array to .npy file atomically from chunks without holding the whole array in memory.
+
+    The array is preallocated on disk as np.memmap and the chunks fill it in C order one by one.
+
+    Args:
+        path (str): Path of the file.
+        shape (tuple): Shape of the array.
+        dtype (type): Type of the array.
+        chunks (iterable): Consecutive 1D np.arrays of the flattened array.
+
+    """
+    def write(f):
+        array = np.lib.format.open_memmap(f.name, mode="w+", dtype=dtype, shape=shape)
+        flat = array.reshape(-1)
+        offset = 0
+        for chunk in chunks:
+            flat[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        if offset != flat.size:
+            raise ValueError("Chunks do not fill the array.")
+        array.flush()
+    write_atomic(path, write)
+
+
+def encode_field(static_field, dtype):
+    """Convert SFF to the storage type.
+
+    Floats keep inf for obstacles, uint16 stores multiples of SFF_QUANTIZATION_STEP
+    and SFF_QUANTIZED_OBSTACLE for obstacles.
+
+    Args:
+        static_field (object): np.array of float SFF values.
+        dtype (type): One of SFF_STORAGE_TYPES.
+
+    Returns:
+        np.array of dtype.
+
+    """
+    if np.dtype(dtype) not in [np.dtype(t) for t in SFF_STORAGE_TYPES]:
+        raise ValueError("Unsupported SFF storage type " + str(dtype))
+    if np.dtype(dtype) != np.uint16:
+        return np.asarray(static_field, dtype=dtype)
+    finite = np.isfinite(static_field)
+    quantized = np.round(static_field[finite] / SFF_QUANTIZATION_STEP)
+    if np.any(quantized >= SFF_QUANTIZED_OBSTACLE):
+        raise ValueError("SFF values are too large for uint16 storage, use float32.")
+    encoded = np.full(shape=static_field.shape, fill_value=SFF_QUANTIZED_OBSTACLE, dtype=np.uint16)
+    encoded[finite] = quantized
+    return encoded
+
+
+def decode_field(encoded):
+    """Convert SFF from the storage type to float, float64 is returned without copy."""
+    if encoded.dtype != np.uint16:
+        return np.asarray(encoded, dtype=np.float64)
+    static_field = encoded * SFF_QUANTIZATION_STEP
+    static_field[encoded == SFF_QUANTIZED_OBSTACLE] = SFF_OBSTACLE
+    return static_field
+
+
+def encoding_error(static_field, dtype):
+    """Upper bound of the difference between SFF values and their encoded and decoded values."""
+    if np.dtype(dtype) == np.uint16:
+        return SFF_QUANTIZATION_STEP / 2
+    return np.finfo(dtype).eps * np.abs(static_field)
+
+
+def decode_value(encoded):
+    """Convert one SFF value from the storage type to float."""
+    if encoded.dtype != np.uint16:
+        return float(encoded)
+    if encoded == SFF_QUANTIZED_OBSTACLE:
+        return SFF_OBSTACLE
+    return encoded * SFF_QUANTIZATION_STEP
+
+
+class FieldLookup:
+    """Dict-like lookup of static floor fields by their source, without storage of the fields.
+
+    model.sff[(x, y)] returns the SFF with source (x, y), named fields such as "Gate" or "Follower"
+    are kept in aliases. Subclasses provide encoded_field, the field of a source in its storage type.
+
+    Attributes:
+        index (object): np.array(height, width) of int index of the source's field, -1 for obstacles.
+        aliases (dict): Named SFF, key(str) and np.array(height, width) of float SFF values.
+
+    """
+    def __init__(self, index):
+        self.index = index
+        self.aliases = {}
+
+    def __getitem__(self, key):
+        if key in self.aliases:
+            return self.aliases[key]
+        return self.source_field(key)
+
+    def __setitem__(self, key, value):
+        self.aliases[key] = value
+
+    def __contains__(self, key):
+        if key in self.aliases:
+            return True
+        try:
+            x, y = key
+            return self.index[y, x] >= 0
+        except (TypeError, ValueError, IndexError):
+            return False
+
+    def __len__(self):
+        return np.count_nonzero(self.index >= 0) + len(self.aliases)
+
+    def source_field(self, source):
+        """SFF with source as the goal.
+
+        Args:
+            source (int, int): xy coordinates of the source cell.
+
+        Returns:
+            np.array(height, width) of float SFF values.
+
+        """
+        return decode_field(self.encoded_field(source))
+
+    def distance(self, source, pos):
+        """SFF value at pos of the field with source (or name of the field) as the goal.
+
+        Reads and decodes only one value of compact fields.
+
+        Args:
+            source: xy coordinates of the source cell or key of a named field.
+            pos (int, int): xy coordinates of the position.
+
+        Returns:
+            float: SFF value.
+
+        """
+        if source in self.aliases:
+            return self.aliases[source][pos[1], pos[0]]
+        return decode_value(self.encoded_field(source)[pos[1], pos[0]])
+
+    def distances(self, source, positions):
+        """SFF values at positions of the field with source as the goal.
+
+        Args:
+            source (int, int): xy coordinates of the source cell.
+            positions (list): xy coordinates of positions.
+
+        Returns:
+            np.array(len(positions)) of float SFF values.
+
+        """
+        xs = [x for x, _ in positions]
+        ys = [y for _, y in positions]
+        return decode_field(self.encoded_field(source)[ys, xs])
+
+    def farthest(self, source, positions):
+        """The most distant of positions from source, the first one of equally distant positions.
+
+        Args:
+            source (int, int): xy coordinates of the source cell.
+            positions (list): xy coordinates of positions, not empty.
+
+        Returns:
+            (float, (int, int)): SFF distance and xy coordinates of the most distant position.
+
+        """
+        distances = self.distances(source, positions)
+        idx = int(np.argmax(distances))
+        return distances[idx], positions[idx]
+
+
+class FieldStore(FieldLookup):
+    """Static floor fields of all source cells in one contiguous array with dict-like access.
+
+    The store is indexed like the former dict of fields, see FieldLookup, the SFF of a source is a view
+    into fields. Fields can be stored in a compact type (see encode_field) and are decoded to float on lookup.
+
+    Attributes:
+        fields (object): np.array(n_sources, height, width) of SFF values in one of SFF_STORAGE_TYPES,
+        np.memmap when loaded from disk.
+        index (object): np.array(height, width) of int index of the source's field in fields, -1 for obstacles.
+
+    """
+    FIELDS_FILE = "fields.npy"
+    INDEX_FILE = "index.npy"
+    # room the fields were computed for, edits of the map are repaired against it
+    ROOM_FILE = "room.npy"
+
+    @classmethod
+    def fields_file(cls, dtype):
+        """Name of the fields file, fields.npy for float64 and e.g. fields.uint16.npy for compact types."""
+        if np.dtype(dtype) == np.float64:
+            return cls.FIELDS_FILE
+        return cls.FIELDS_FILE[:-len(".npy")] + "." + np.dtype(dtype).name + ".npy"
+
+    def __init__(self, fields, index):
+        super().__init__(index)
+        self.fields = fields
+
+    def encoded_field(self, source):
+        """SFF with source as the goal in the storage type."""
+        x, y = source
+        idx = self.index[y, x]
+        if idx < 0:
+            raise KeyError(source)
+        return self.fields[idx]
+
+    def column(self, pos):
+        """SFF values at pos of the fields of all sources in the order of index."""
+        return decode_field(self.fields[:, pos[1], pos[0]])
+
+    def encode(self, dtype):
+        """Copy of the store with fields converted to the storage type dtype."""
+        fields = np.empty(shape=self.fields.shape, dtype=dtype)
+        for idx in range(len(self.fields)):
+            fields[idx] = encode_field(decode_field(self.fields[idx]), dtype)
+        return FieldStore(fields, self.index)
+
+    def sources(self):
+        """xy coordinates of all source cells in the order of fields."""
+        ys, xs = np.nonzero(self.index >= 0)
+        order = np.argsort(self.index[ys, xs])
+        return list(zip(xs[order].tolist(), ys[order].tolist()))
+
+    def save(self, folder):
+        """Save fields and index to folder as .npy files which can be memory-mapped.
+
+        Files are replaced atomically, so processes which save the same fields at once do not clash.
+
+        """
+        os.makedirs(folder, exist_ok=True)
+        save_array(os.path.join(folder, self.fields_file(self.fields.dtype)), self.fields)
+        save_array(os.path.join(folder, self.INDEX_FILE), self.index)
+
+    @classmethod
+    def load(cls, folder, dtype=np.float64):
+        """Open fields of storage type dtype saved in folder as read-only np.memmap.
+
+        Every process which loads the same folder shares the pages of fields through the page cache.
+
+        """
+        index = np.load(os.path.join(folder, cls.INDEX_FILE))
+        fields = np.load(os.path.join(folder, cls.fields_file(dtype)), mmap_mode="r")
+        return cls(fields, index)
+
+    @classmethod
+    def exists(cls, folder, dtype=np.float64):
+        return os.path.isfile(os.path.join(folder, cls.INDEX_FILE)) and \
+            os.path.isfile(os.path.join(folder, cls.fields_file(dtype)))
+
+    @classmethod
+    def from_dict(cls, sff, shape):
+        """Convert the dict of fields keyed by xy coordinates of the source, string keys are dropped.
+
+        Args:
+            sff (dict): xy coordinates(key) and np.array(height, width) of float SFF values.
+            shape (int, int): Height and width of the room.
+
+        """
+        sources = [key for key in sff if isinstance(key, tuple)]
+        fields = np.empty(shape=(len(sources), *shape))
+        index = np.full(shape=shape, fill_value=-1, dtype=np.int32)
+        for idx, (x, y) in enumerate(sources):
+            fields[idx] = sff[(x, y)]
+            index[y, x] = idx
+        return cls(fields, index)
+
+
+class PairwiseStore(FieldStore):
+    """Distances of all pairs of walkable cells, each unordered pair stored once.
+
+    The distance on the grid is symmetric, d(a, b) = d(b, a), so only the upper triangle of the
+    matrix of distances between walkable cells is kept, packed row by row in fields. Compared to
+    FieldStore it takes less than half of the space and the SFF of a source is rebuilt on lookup.
+
+    Attributes:
+        fields (object): np.array(n * (n + 1) / 2) of packed distances in one of SFF_STORAGE_TYPES,
+        n is the number of walkable cells.
+        index (object): np.array(height, width) of int index of the walkable cell, -1 for obstacles.
+        offsets (object): np.array(n) of int position of the first distance of each row in fields.
+        cells (object, object): y and x coordinates of walkable cells in the order of index.
+
+    """
+    FIELDS_FILE = "pairs.npy"
+
+    def __init__(self, fields, index):
+        super().__init__(fields, index)
+        n = np.count_nonzero(index >= 0)
+        rows = np.arange(n, dtype=np.int64)
+        self.offsets = rows * n - rows * (rows - 1) // 2
+        ys, xs = np.nonzero(index >= 0)
+        order = np.argsort(index[ys, xs])
+        self.cells = ys[order], xs[order]
+
+    def pair_index(self, i, j):
+        """Position of the distance of cells with index i and j in fields."""
+        if i > j:
+            i, j = j, i
+        return int(self.offsets[i]) + j - i
+
+    def encoded_row(self, i):
+        """Distances from the cell with index i to all walkable cells in the storage type."""
+        n = len(self.offsets)
+        before = np.arange(i)
+        positions = np.concatenate([self.offsets[:i] + i - before, self.offsets[i] + np.arange(n - i)])
+        return self.fields[positions]
+
+    def source_field(self, source):
+        x, y = source
+        i = self.index[y, x]
+        if i < 0:
+            raise KeyError(source)
+        static_field = np.full(shape=self.index.shape, fill_value=SFF_OBSTACLE)
+        static_field[self.cells] = decode_field(self.encoded_row(int(i)))
+        return static_field
+
+    def encoded_field(self, source):
+        return encode_field(self.source_field(source), self.fields.dtype)
+
+    def distance(self, source, pos):
+        """Distance of source and pos, read directly from the packed pairs.
+
+        Args:
+            source: xy coordinates of the source cell or key of a named field.
+            pos (int, int): xy coordinates of the position.
+
+        Returns:
+            float: SFF value.
+
+        """
+        if source in self.aliases:
+            return self.aliases[source][pos[1], pos[0]]
+        i = self.index[source[1], source[0]]
+        if i < 0:
+            raise KeyError(source)
+        j = self.index[pos[1], pos[0]]
+        if j < 0:
+            return SFF_OBSTACLE
+        return decode_value(self.fields[self.pair_index(int(i), int(j))])
+
+    def distances(self, source, positions):
+        i = self.index[source[1], source[0]]
+        if i < 0:
+            raise KeyError(source)
+        distances = decode_field(self.encoded_row(int(i)))
+        js = np.array([self.index[y, x] for x, y in positions])
+        return np.where(js >= 0, distances[js], SFF_OBSTACLE)
+
+    def column(self, pos):
+        i = self.index[pos[1], pos[0]]
+        if i < 0:
+            return np.full(shape=len(self.offsets), fill_value=SFF_OBSTACLE)
+        return decode_field(self.encoded_row(int(i)))
+
+    def encode(self, dtype):
+        return PairwiseStore(encode_field(decode_field(self.fields), dtype), self.index)
+
+
+class ProgressiveFieldStore(FieldStore):
+    """Fields of all sources computed on a background thread while the store is already in use.
+
+    Fields of priority sources are computed before the store is returned, the rest follow in the order
+    of index. A lookup of a field which is not computed yet computes only that field in the calling thread.
+
+    Attributes:
+        room (object): np.array(height, width) of map symbols without gate.
+        computed (object): np.array(n_sources) of bool, True if the field of the source is in fields.
+        complete (threading.Event): Set when fields of all sources are computed.
+        thread (threading.Thread): Computes the remaining fields.
+
+    """
+    def __init__(self, room, index, priority=(), dtype=np.float64, on_complete=None):
+        n = np.count_nonzero(index >= 0)
+        super().__init__(np.empty(shape=(n,) + room.shape, dtype=dtype), index)
+        self.room = room
+        self.computed = np.zeros(shape=n, dtype=bool)
+        self.complete = threading.Event()
+        for source in priority:
+            self.encoded_field(source)
+        self.thread = threading.Thread(target=self.fill, args=(on_complete,), daemon=True)
+        self.thread.start()
+
+    def encoded_field(self, source):
+        x, y = source
+        idx = self.index[y, x]
+        if idx < 0:
+            raise KeyError(source)
+        if not self.computed[idx]:
+            self.compute(idx, (x, y))
+        return self.fields[idx]
+
+    def compute(self, idx, source):
+        # both threads may compute the same field, they write the same values
+        self.fields[idx] = encode_field(compute_source_field(self.room, source), self.fields.dtype)
+        self.computed[idx] = True
+
+    def fill(self, on_complete):
+        """Computes the missing fields and calls on_complete(store) if it is not None."""
+        for idx, source in enumerate(self.sources()):
+            if not self.computed[idx]:
+                self.compute(idx, source)
+        self.complete.set()
+        if on_complete is not None:
+            on_complete(self)
+
+    def column(self, pos):
+        self.complete.wait()
+        return super().column(pos)
+
+    def encode(self, dtype):
+        self.complete.wait()
+        return super().encode(dtype)
+
+    def save(self, folder):
+        self.complete.wait()
+        super().save(folder)
+
+
+class LazyFieldStore(FieldLookup):
+    """Static floor fields computed on first access and kept in a size-bounded LRU cache.
+
+    Agents read only a few fields per step, so nothing is precomputed and memory is bounded by the
+    cache size instead of growing with the square of the number of cells.
+
+    Attributes:
+        room (object): np.array(height, width) of map symbols without gate.
+        cache (LRUCache): Computed fields in the storage type dtype, key xy coordinates of the source,
+        with hit and miss counters.
+        dtype (type): Storage type of cached fields, one of SFF_STORAGE_TYPES.
+
+    """
+    def __init__(self, room, cache_size=128, dtype=np.float64):
+        index = np.full(shape=room.shape, fill_value=-1, dtype=np.int32)
+        walkable = room >= 0
+        index[walkable] = np.arange(np.count_nonzero(walkable))
+        super().__init__(index)
+        self.room = room
+        self.cache = LRUCache(cache_size)
+        self.dtype = dtype
+
+    def encoded_field(self, source):
+        encoded = self.cache.get(source)
+        if encoded is not None:
+            return encoded
+        x, y = source
+        if self.index[y, x] < 0:
+            raise KeyError(source)
+        encoded = encode_field(self.compute_field((x, y)), self.dtype)
+        # the field is shared by all readers, same as the read-only np.memmap of FieldStore
+        encoded.flags.writeable = False
+        self.cache.put(source, encoded)
+        return encoded
+
+    def compute_field(self, source):
+        """Exact SFF of the walkable source cell."""
+        return compute_source_field(self.room, source)
+
+
+class LandmarkStore(LazyFieldStore):
+    """Distance oracle for large maps with fields of a few landmark cells and exact fields of hot sources.
+
+    Memory is linear in the size of the map, the landmark fields and the LRU cache of exact fields of
+    sources which agents query (gate, leaders). For d(l, a) and d(l, b) of a landmark l the triangle
+    inequality bounds d(a, b) from both sides, which prunes the search for the most distant agent.
+
+    Attributes:
+        landmarks (list): xy coordinates of landmark cells.
+        landmark_fields (object): np.array(n_landmarks, height, width) of float SFF of landmarks.
+
+    """
+    def __init__(self, room, n_landmarks=16, cache_size=128, dtype=np.float64):
+        super().__init__(room, cache_size, dtype)
+        self.landmarks = []
+        fields = []
+        # farthest point selection spreads the landmarks over the map, the first one is opposite to any cell
+        ys, xs = np.nonzero(room >= 0)
+        nearest = compute_source_field(room, (xs[0], ys[0]))
+        for _ in range(min(n_landmarks, len(xs))):
+            y, x = np.unravel_index(np.argmax(np.where(np.isfinite(nearest), nearest, -1)), nearest.shape)
+            self.landmarks.append((int(x), int(y)))
+            fields.append(compute_source_field(room, (x, y)))
+            nearest = fields[-1] if len(fields) == 1 else np.minimum(nearest, fields[-1])
+        self.landmark_fields = np.array(fields)
+
+    def bounds(self, source, positions):
+        """Lower and upper bounds of the distances from source to positions given by the landmarks.
+
+        Args:
+            source (int, int): xy coordinates of the source cell.
+            positions (list): xy coordinates of positions.
+
+        Returns:
+            (np.array, np.array): float lower and upper bounds for each of positions.
+
+        """
+        xs = [x for x, _ in positions]
+        ys = [y for _, y in positions]
+        source_dist = self.landmark_fields[:, source[1], source[0]][:, np.newaxis]
+        positions_dist = self.landmark_fields[:, ys, xs]
+        with np.errstate(invalid="ignore"):
+            # a landmark which reaches neither cell gives no bound
+            lower = np.nan_to_num(np.abs(source_dist - positions_dist), nan=0, posinf=SFF_OBSTACLE)
+        upper = np.min(source_dist + positions_dist, axis=0)
+        return np.max(lower, axis=0), upper
+
+    def distances(self, source, positions):
+        """Exact distances, from the cached field of source or by a search which stops at the last position."""
+        if source in self.cache:
+            return super().distances(source, positions)
+        x, y = source
+        if self.index[y, x] < 0:
+            raise KeyError(source)
+        distances = np.full(shape=len(positions), fill_value=SFF_OBSTACLE)
+        walkable = [idx for idx, (px, py) in enumerate(positions) if self.index[py, px] >= 0]
+        distances[walkable] = compute_target_distances(self.room, source, [positions[idx] for idx in walkable])
+        return distances
+
+    def farthest(self, source, positions):
+        """The most distant of positions, positions which are nearer by the landmark bounds are not searched."""
+        if source in self.cache:
+            return super().farthest(source, positions)
+        lower, upper = self.bounds(source, positions)
+        # the tolerance keeps positions whose bounds differ from the exact distance by rounding
+        candidates = [idx for idx in range(len(positions)) if upper[idx] + 1e-9 >= np.max(lower)]
+        distances = self.distances(source, [positions[idx] for idx in candidates])
+        idx = int(np.argmax(distances))
+        return distances[idx], positions[candidates[idx]]
+
+
+class HierarchicalStore(LazyFieldStore):
+    """Static floor fields of buildings assembled from fields of rooms joined by doors.
+
+    Door cells (see find_doors) split the walkable cells into regions. For every door of a region
+    the distances within the region are precomputed, and the distances between all doors over the
+    whole building form the coarse graph. A shortest path leaves the region of the source through
+    some door a and enters the region of the target through some door b, so
+
+        d(s, t) = min over a, b of d(s, a) + D(a, b) + d(b, t)
+
+    besides the path inside the region when s and t share it. Memory and precompute grow with the
+    size of regions times the number of their doors instead of the square of the number of cells.
+    Assembled fields are kept in the LRU cache.
+
+    Distances are summed in a different order than along the path of the flat kernel, so they can differ
+    from its fields in the last bits (about 1e-13). Ties between cells of equal SFF can break differently,
+    the same seed can give different trajectories than the flat fields.
+
+    Attributes:
+        doors (list): xy coordinates of door cells.
+        door_index (object): np.array(height, width) of int index of door cells in doors, -1 for other cells.
+        labels (object): np.array(height, width) of int region of cells, -1 for doors and obstacles.
+        regions (list): Per region np.array of y and x coordinates of its cells.
+        region_doors (list): Per region np.array of int indices of doors adjacent to the region.
+        local (list): Per region np.array(n_region_doors, n_region_cells) of float distances inside the region.
+        door_distances (object): np.array(n_doors, n_doors) of float distances between doors.
+
+    """
+    def __init__(self, room, cache_size=128, dtype=np.float64):
+        super().__init__(room, cache_size, dtype)
+        walkable = room >= 0
+        doors = find_doors(room)
+        self.labels, n_regions = label_regions(walkable & ~doors)
+        ys, xs = np.nonzero(doors)
+        self.doors = list(zip(xs.tolist(), ys.tolist()))
+        self.door_index = np.full(shape=room.shape, fill_value=-1)
+        self.door_index[ys, xs] = np.arange(len(self.doors))
+        self.regions = []
+        self.region_doors = []
+        self.local = []
+        for region in range(n_regions):
+            cells = np.nonzero(self.labels == region)
+            self.regions.append(cells)
+            self.region_doors.append(np.array(sorted(set(
+                self.door_index[y, x] for y, x in self.neighbours(cells) if self.door_index[y, x] >= 0)), dtype=int))
+            self.local.append(np.array([self.door_region_distances(door, region)
+                                        for door in self.region_doors[region]]).reshape(-1, len(cells[0])))
+        self.door_distances = self.compute_door_distances()
+
+    def neighbours(self, cells):
+        """yx coordinates of Moore neighbours of cells inside the room."""
+        height, width = self.room.shape
+        ys, xs = cells
+        result = set()
+        for dy in [-1, 0, 1]:
+            for dx in [-1, 0, 1]:
+                ny, nx = ys + dy, xs + dx
+                inside = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+                result.update(zip(ny[inside].tolist(), nx[inside].tolist()))
+        return result
+
+    def door_region_distances(self, door, region):
+        """Distances from the door to cells of region by paths inside the region."""
+        walkable = self.labels == region
+        x, y = self.doors[door]
+        walkable[y, x] = True
+        return region_distances(walkable, (x, y), self.regions[region])
+
+    def exits(self, distances, region):
+        """Distances to the doors of region from distances to cells of the region.
+
+        Args:
+            distances (object): np.array of float distances to cells of region, in the order of its cells.
+            region (int): Region of the cells.
+
+        Returns:
+            np.array(len(region_doors[region])) of float distances to its doors through the region.
+
+        """
+        ys, xs = self.regions[region]
+        result = np.full(shape=len(self.region_doors[region]), fill_value=SFF_OBSTACLE)
+        for idx, door in enumerate(self.region_doors[region]):
+            x, y = self.doors[door]
+            dx = np.abs(xs - x)
+            dy = np.abs(ys - y)
+            near = (dx <= 1) & (dy <= 1)
+            if np.any(near):
+                steps = np.where((dx[near] == 1) & (dy[near] == 1), DIAGONAL_PRICE, 1.0)
+                result[idx] = np.min(distances[near] + steps)
+        return result
+
+    def compute_door_distances(self):
+        """Distances between all doors over the coarse graph of doors and regions."""
+        n_doors = len(self.doors)
+        door_distances = np.full(shape=(n_doors, n_doors), fill_value=SFF_OBSTACLE)
+        np.fill_diagonal(door_distances, 0)
+        # doors next to each other
+        for a, (ax, ay) in enumerate(self.doors):
+            for b, (bx, by) in enumerate(self.doors):
+                if a != b and abs(ax - bx) <= 1 and abs(ay - by) <= 1:
+                    door_distances[a, b] = DIAGONAL_PRICE if ax != bx and ay != by else 1.0
+        # doors of the same region
+        for region, region_doors in enumerate(self.region_doors):
+            for a, local in zip(region_doors, self.local[region]):
+                door_distances[a, region_doors] = np.minimum(door_distances[a, region_doors],
+                                                             self.exits(local, region))
+        # shortest paths over the coarse graph, Floyd-Warshall on the small matrix of doors
+        for door in range(n_doors):
+            door_distances = np.minimum(door_distances,
+                                        door_distances[:, door, np.newaxis] + door_distances[np.newaxis, door, :])
+        return door_distances
+
+    def compute_field(self, source):
+        x, y = source
+        static_field = np.full(shape=self.room.shape, fill_value=SFF_OBSTACLE)
+        door = self.door_index[y, x]
+        source_region = self.labels[y, x]
+        if door >= 0:
+            door_distances = self.door_distances[door]
+        else:
+            walkable = self.labels == source_region
+            inside = region_distances(walkable, source, self.regions[source_region])
+            static_field[self.regions[source_region]] = inside
+            door_distances = np.full(shape=len(self.doors), fill_value=SFF_OBSTACLE)
+            exits = self.exits(inside, source_region)
+            for exit_door, exit_distance in zip(self.region_doors[source_region], exits):
+                door_distances = np.minimum(door_distances, exit_distance + self.door_distances[exit_door])
+        for region, cells in enumerate(self.regions):
+            if len(self.region_doors[region]) == 0:
+                continue
+            through_doors = np.min(door_distances[self.region_doors[region], np.newaxis] + self.local[region], axis=0)
+            static_field[cells] = np.minimum(static_field[cells], through_doors)
+        if len(self.doors) > 0:
+            door_ys = [door_y for _, door_y in self.doors]
+            door_xs = [door_x for door_x, _ in self.doors]
+            static_field[door_ys, door_xs] = door_distances
+        return static_field
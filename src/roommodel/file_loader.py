@@ -1,22 +1,31 @@
 import os
 import time
+import hashlib
 import copy
+import functools
+import multiprocessing
 import numpy as np
 import pickle
 import mesa
 
 from .cell import Cell
+from .field_store import FieldStore, PairwiseStore, LazyFieldStore, ProgressiveFieldStore, LandmarkStore,\
+    HierarchicalStore, encode_field, encoding_error, save_array, save_array_chunks, write_atomic
 from .leader import LeaderAgent, VirtualLeader
 from .directed import DirectedAgent
 from .goal import GateGoal, AreaGoal, LocationGoal, GuardGoal
 from .utils.constants import MAP_SYMBOLS, OBSTACLE, LEADER, FOLLOWER, DIRECTED, PAIR_DIRECTED, EXIT_GOAL_SYMBOL,\
-    AREA_GOAL_SYMBOL, LOCATION_GOAL_SYMBOL, GUARD_GOAL_SYMBOL, ORIENTATION, GATE, EMPTY
-from .utils.room import compute_static_field
+    AREA_GOAL_SYMBOL, LOCATION_GOAL_SYMBOL, GUARD_GOAL_SYMBOL, ORIENTATION, GATE, EMPTY, SFF_OBSTACLE,\
+    SFF_ALGORITHM_VERSION, SFF_BACKENDS
+from .utils.room import compute_source_field, compute_source_distances, compute_area_field, repair_source_field,\
+    compute_source_fields_wavefront, DIAGONAL_PRICE
 from .utils.portrayal import agent_portrayal
 
 
 class FileLoader:
-    def __init__(self, filename):
+    def __init__(self, filename, static_fields=True, processes=None, lazy=False, cache_size=128, dtype=np.float64,
+                 pairwise=False, landmarks=0, hierarchical=False, backend=SFF_BACKENDS[0], batch_size=64,
+                 chunk_size=64, progressive=False):
 
         if not os.path.isfile(filename):
             raise FileNotFoundError("Map file not found.")
@@ -33,8 +42,33 @@ class FileLoader:
         }
         self.load_topology()
         self.sff = {}
-        self.hash_control_active = True
-        self.load_sff()
+        # SFF of goal areas, key (lt, rb) corners of the area
+        self.area_fields = {}
+        # size of the process pool for SFF precomputation, None uses all cores, 1 computes serially
+        self.processes = processes
+        # lazy fields are computed on first access and at most cache_size of them are kept in memory
+        self.lazy = lazy
+        self.cache_size = cache_size
+        # storage type of SFF, compact types (see SFF_STORAGE_TYPES) are decoded to float on lookup
+        self.dtype = dtype
+        # distances of pairs of cells are stored once instead of a full SFF for every source
+        self.pairwise = pairwise
+        # number of landmark fields of the distance oracle for large maps, 0 uses stored fields
+        self.landmarks = landmarks
+        # fields are assembled from fields of rooms and distances between doors, for buildings of many rooms
+        self.hierarchical = hierarchical
+        # algorithm of stored fields (see SFF_BACKENDS), wavefront computes batch_size sources per sweep
+        if backend not in SFF_BACKENDS:
+            raise ValueError("Unknown SFF backend " + str(backend))
+        self.backend = backend
+        self.batch_size = batch_size
+        # fields are streamed to disk, at most chunk_size of them are held in memory at once
+        self.chunk_size = chunk_size
+        # missing fields are computed on a background thread, only fields of the first goals before start
+        self.progressive = progressive
+        # without static fields only the topology and goals are available, e.g. for benchmarks
+        if static_fields:
+            self.load_sff()
         self.directed_generator = None
         self.leader_generator = None
         self.follower_generator = None
@@ -86,6 +120,30 @@ class FileLoader:
                 goals_list.append(GuardGoal(model, *lt, wait_time, target))
         return goals_list
 
+    def area_field(self, area):
+        """SFF of distances to the nearest cell of area.
+
+        Fields of one cell areas are looked up in SFF, larger areas are computed by one multi-source search.
+
+        Args:
+            area (lt, rb): Left top xy coordinates and right bottom xy coordinates of the area.
+
+        Returns:
+            np.array(height, width) of float SFF values, read-only.
+
+        """
+        lt, rb = area
+        key = (tuple(lt), tuple(rb))
+        if key not in self.area_fields:
+            if key[0] == key[1]:
+                static_field = self.sff[key[0]]
+            else:
+                cells = [(x, y) for x in range(lt[0], rb[0] + 1) for y in range(rb[1], lt[1] + 1)]
+                static_field = compute_area_field(self.room_without_gate(), cells)
+                static_field.flags.writeable = False
+            self.area_fields[key] = static_field
+        return self.area_fields[key]
+
     def get_canvas(self, resolution):
         CELL_SIZE = 30
         canvas_width = CELL_SIZE*self.width
@@ -191,23 +249,144 @@ class FileLoader:
             raise FileNotFoundError("Filename for map loading cannot be None.")
         if not os.path.isfile(self.filename):
             raise FileExistsError("File", self.filename, "for map loading not found.")
+        if self.hierarchical:
+            self.sff = HierarchicalStore(self.room_without_gate(), self.cache_size, self.dtype)
+            self.sff["Gate"] = self.sff[self.gate]
+            return
+        if self.landmarks:
+            self.sff = LandmarkStore(self.room_without_gate(), self.landmarks, self.cache_size, self.dtype)
+            self.sff["Gate"] = self.sff[self.gate]
+            return
+        if self.lazy:
+            self.sff = LazyFieldStore(self.room_without_gate(), self.cache_size, self.dtype)
+            self.sff["Gate"] = self.sff[self.gate]
+            return
+        data_folder = self.sff_folder()
+        store = PairwiseStore if self.pairwise else FieldStore
+        if not store.exists(data_folder, self.dtype):
+            if store.exists(data_folder):
+                # compact fields are converted from the exact float64 fields instead of recomputed
+                store.load(data_folder).encode(self.dtype).save(data_folder)
+            elif not self.convert_sff(data_folder) and not self.repair_sff(self.previous_sff_folder(), data_folder):
+                if self.progressive and not self.pairwise:
+                    self.load_progressive(data_folder)
+                    return
+                self.process_sff(data_folder)
+        self.write_sff_pointer(data_folder)
+        self.sff = store.load(data_folder, self.dtype)
+        self.sff["Gate"] = self.sff[self.gate]
+
+    def load_progressive(self, data_folder):
+        """Starts computing SFF on a background thread and stores them when all are computed.
+
+        Fields of priority_sources are computed first, so the model can start before the rest is ready.
+
+        Args:
+            data_folder (str): Folder of the stored fields.
+
+        """
+        room = self.room_without_gate()
+
+        def store(sff):
+            try:
+                sff.save(data_folder)
+                save_array(os.path.join(data_folder, FieldStore.ROOM_FILE), room)
+            except OSError as e:
+                print("SFF not stored:", e)
+                return
+            self.write_sff_pointer(data_folder)
+
+        index = self.source_index(self.room_sources(room))
+        self.sff = ProgressiveFieldStore(room, index, self.priority_sources(), self.dtype, on_complete=store)
+        self.sff["Gate"] = self.sff[self.gate]
+
+    def priority_sources(self):
+        """Sources of fields needed by the first goals: gate, start cells of leaders and centers of goal areas."""
+        sources = [self.gate] + list(self.pos[LEADER])
+        for goal in self.goals:
+            corners = goal[1]
+            xs = [x for x, _ in corners]
+            ys = [y for _, y in corners]
+            sources.append(((min(xs) + max(xs)) // 2, (min(ys) + max(ys)) // 2))
+        return [(x, y) for x, y in sources if self.room[y, x] != MAP_SYMBOLS[OBSTACLE]]
+
+    def sff_cached(self):
+        """True if SFF of the room are stored in the layout and storage type of the loader."""
+        store = PairwiseStore if self.pairwise else FieldStore
+        return store.exists(self.sff_folder(), self.dtype)
+
+    def maps_data_folder(self):
         topology_folder = os.path.dirname(self.filename)
         maps_folder = os.path.dirname(topology_folder)
-        filename_without_type = self.filename.split(os.sep)[-1][:- len(".txt")]
-        data_file = maps_folder + "/data/" + filename_without_type + ".data"
-        if not os.path.isfile(data_file):
-            self.process_sff(data_file)
+        return os.path.join(maps_folder, "data")
+
+    def room_digest(self):
+        """Digest of the room without gate and SFF_ALGORITHM_VERSION, the key of stored SFF.
+
+        Maps which differ only in gate, agents or goals have the same digest and share their fields.
+
+        """
+        room = self.room_without_gate()
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(SFF_ALGORITHM_VERSION).encode())
+        digest.update(str(room.shape).encode())
+        digest.update(np.ascontiguousarray(room, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def sff_folder(self):
+        """Folder of stored SFF of the room, maps/data/<room digest>."""
+        return os.path.join(self.maps_data_folder(), self.room_digest())
+
+    def sff_pointer_file(self):
+        """File with the digest of the room of the last SFF loaded for the map, used to repair map edits."""
+        filename_without_type = os.path.basename(self.filename)[:- len(".txt")]
+        return os.path.join(self.maps_data_folder(), filename_without_type + ".sff")
+
+    def previous_sff_folder(self):
+        """Folder of the SFF last loaded for the map, None if there is none."""
+        pointer_file = self.sff_pointer_file()
+        if not os.path.isfile(pointer_file):
+            return None
+        with open(pointer_file) as f:
+            return os.path.join(self.maps_data_folder(), f.read().strip())
+
+    def write_sff_pointer(self, data_folder):
+        if self.previous_sff_folder() == data_folder:
+            return
+        digest = os.path.basename(data_folder)
+        try:
+            write_atomic(self.sff_pointer_file(), lambda f: f.write(digest.encode()))
+        except OSError:
+            # the pointer only speeds up repairs, stored fields are usable in read-only checkouts without it
+            pass
+
+    def convert_sff(self, data_folder):
+        """Converts pickled dict of SFF from older versions to the memory-mapped format.
+
+        The pickle belongs to the room whose deterministic_hash was written to the map file.
+
+        Returns:
+            bool: True if the fields were converted, False if there is no valid pickle of the map.
+
+        """
+        filename_without_type = os.path.basename(self.filename)[:- len(".txt")]
+        data_file = os.path.join(self.maps_data_folder(), filename_without_type + ".data")
+        if self.pairwise or not os.path.isfile(data_file):
+            return False
         with open(self.filename) as f:
-            lines = f.readlines()
-            if len(lines) == 0:
-                raise ValueError("Map file is empty.")
-            lines = [line.rstrip() for line in lines]
-            map_hash = self.deterministic_hash(self.room)
+            lines = [line.rstrip() for line in f.readlines()]
+        try:
             hash_line = int(lines[self.height])
-        if map_hash != hash_line and self.hash_control_active:
-            self.process_sff(data_file)
+        except (IndexError, ValueError):
+            return False
+        if hash_line != self.deterministic_hash(self.room):
+            return False
+        print("Converting SFF", data_file, "to", data_folder)
         with open(data_file, "rb") as f:
-            self.sff = pickle.load(f)
+            sff = pickle.load(f)
+        FieldStore.from_dict(sff, self.room.shape).encode(self.dtype).save(data_folder)
+        save_array(os.path.join(data_folder, FieldStore.ROOM_FILE), self.room_without_gate())
+        return True
 
     def deterministic_hash(self, grid):
         bytes_value = grid.data.tobytes()
@@ -220,31 +399,239 @@ class FileLoader:
         hash_value = sum([int.from_bytes(token, byteorder="big") for token in tokens])
         return hash_value
 
-    def process_sff(self, data_file):
+    def process_sff(self, data_folder):
         print("Calculating SFF for", self.filename)
         start = time.time()
-        room = copy.deepcopy(self.room)
-        gate = self.gate
-        room[gate[1], gate[0]] = MAP_SYMBOLS[EMPTY]
-        self.sff = {}
-        cnt = 0
-        for x in range(self.width):
-            for y in range(self.height):
-                cnt += 1
-                if cnt % 32 == 1:
-                    print(cnt, "/", self.width*self.height)
-                if room[y, x] == MAP_SYMBOLS[OBSTACLE]:
-                    continue
-                room[y, x] = MAP_SYMBOLS[GATE]
-                self.sff[(x, y)] = compute_static_field(room, normalize=False)
-                room[y, x] = MAP_SYMBOLS[EMPTY]
-        self.sff["Gate"] = self.sff[self.gate]
+        room = self.room_without_gate()
+        sources = self.room_sources(room)
+        if self.pairwise:
+            self.save_fields(data_folder, sources, self.source_pairs(room, sources))
+        else:
+            fields = (static_field for _, static_field in self.source_fields(room, sources))
+            self.save_fields(data_folder, sources, fields)
         print("SFF calculated in:", time.time() - start, "seconds.")
-        with open(data_file, "wb") as f:
-            pickle.dump(self.sff, f)
-        map_hash = self.deterministic_hash(self.room)
-        with open(self.filename) as f:
-            lines = f.readlines()
-        lines[self.height] = str(map_hash)+"\n"
-        with open(self.filename, "w") as f:
-            f.writelines(lines)
+        save_array(os.path.join(data_folder, FieldStore.ROOM_FILE), room)
+
+    def repair_sff(self, previous_folder, data_folder):
+        """Computes SFF after an edit of the map from the previous fields instead of all of them again.
+
+        The room of the previous fields is compared to the current one. New obstacles only make paths
+        longer, so fields of sources whose shortest paths pass through a new obstacle are recomputed.
+        Removed obstacles only make paths shorter, the other fields are lowered from the opened cells
+        by repair_source_field. Fields of opened cells are computed. Lowering compact storage types
+        would add their encoding error to the fields, so they are repaired only if no obstacle was removed.
+
+        Args:
+            previous_folder (str): Folder with the previous fields and room, may be None.
+            data_folder (str): Folder of the repaired fields.
+
+        Returns:
+            bool: True if the fields were repaired, False if they have to be computed from scratch.
+
+        """
+        store = PairwiseStore if self.pairwise else FieldStore
+        if previous_folder is None or previous_folder == data_folder:
+            return False
+        room_file = os.path.join(previous_folder, FieldStore.ROOM_FILE)
+        if not os.path.isfile(room_file) or not store.exists(previous_folder, self.dtype):
+            return False
+        previous_room = np.load(room_file)
+        room = self.room_without_gate()
+        if previous_room.shape != room.shape:
+            return False
+        walkable = room != MAP_SYMBOLS[OBSTACLE]
+        previous_walkable = previous_room != MAP_SYMBOLS[OBSTACLE]
+        blocked = [(x, y) for y, x in zip(*np.nonzero(previous_walkable & ~walkable))]
+        opened = [(x, y) for y, x in zip(*np.nonzero(~previous_walkable & walkable))]
+        if opened and np.dtype(self.dtype) != np.float64:
+            return False
+        print("Repairing SFF for", self.filename)
+        start = time.time()
+        sff = store.load(previous_folder, self.dtype)
+        affected = self.affected_sources(sff, room, blocked)
+        sources = self.room_sources(room)
+        recomputed = [source for source in sources if sff.index[source[1], source[0]] < 0 or
+                      affected[sff.index[source[1], source[0]]]]
+
+        def repaired_fields():
+            # recomputed sources follow the order of sources, their fields are merged in as they arrive
+            recomputed_fields = self.source_fields(room, recomputed)
+            recomputed_sources = set(recomputed)
+            for source in sources:
+                if source in recomputed_sources:
+                    yield next(recomputed_fields)
+                    continue
+                static_field = np.array(sff.source_field(source), dtype=np.float64)
+                static_field[~walkable] = SFF_OBSTACLE
+                if opened:
+                    static_field = repair_source_field(room, static_field, opened)
+                yield source, static_field
+
+        rows = (static_field for _, static_field in repaired_fields())
+        if self.pairwise:
+            xs = np.array([x for x, _ in sources])
+            ys = np.array([y for _, y in sources])
+            rows = (static_field[ys[idx:], xs[idx:]] for idx, static_field in enumerate(rows))
+        self.save_fields(data_folder, sources, rows)
+        print("SFF repaired in:", time.time() - start, "seconds,", len(recomputed), "of", len(sources),
+              "fields recomputed.")
+        save_array(os.path.join(data_folder, FieldStore.ROOM_FILE), room)
+        return True
+
+    def affected_sources(self, sff, room, blocked):
+        """Sources whose fields change when the blocked cells become obstacles.
+
+        A field changes only if a walkable neighbour of a blocked cell is exactly one step further
+        from the source and all of its shortest paths lead through blocked cells. Near ties of
+        compact storage types can not be told apart, there every shortest path through a blocked
+        cell marks the source as affected.
+
+        Args:
+            sff (FieldStore): Fields of the room before the edit.
+            room (object): np.array(height, width) of map symbols after the edit.
+            blocked (list): xy coordinates of cells which became obstacles.
+
+        Returns:
+            np.array of bool, True for affected sources in the order of sff.index.
+
+        """
+        columns = {}
+
+        def column(pos):
+            if pos not in columns:
+                columns[pos] = sff.column(pos)
+            return columns[pos]
+
+        def walkable_neighbours(pos):
+            x, y = pos
+            for dx in [-1, 0, 1]:
+                for dy in [-1, 0, 1]:
+                    nx, ny = x + dx, y + dy
+                    if (dx == 0 and dy == 0) or not (0 <= nx < self.width and 0 <= ny < self.height):
+                        continue
+                    if room[ny, nx] != MAP_SYMBOLS[OBSTACLE]:
+                        yield (nx, ny), DIAGONAL_PRICE if dx != 0 and dy != 0 else 1
+
+        exact = np.dtype(self.dtype) == np.float64
+        affected = np.zeros(shape=np.count_nonzero(sff.index >= 0), dtype=bool)
+        for pos in blocked:
+            blocked_dist = column(pos)
+            blocked_error = encoding_error(blocked_dist, self.dtype)
+            reachable = np.isfinite(blocked_dist)
+            for neighbour, step in walkable_neighbours(pos):
+                dist = column(neighbour)
+                # values of compact storage types are compared with their encoding error
+                tolerance = blocked_error + encoding_error(dist, self.dtype) + 1e-9
+                through_blocked = reachable & (dist + tolerance >= blocked_dist + step)
+                if exact:
+                    # the distance is kept if a shortest path leads to the neighbour from a walkable cell
+                    for other, other_step in walkable_neighbours(neighbour):
+                        through_blocked &= column(other) + other_step > dist + 1e-9
+                affected |= through_blocked
+        return affected
+
+    def room_without_gate(self):
+        """Room of the SFF, the gate is an ordinary walkable cell."""
+        room = copy.deepcopy(self.room)
+        room[self.gate[1], self.gate[0]] = MAP_SYMBOLS[EMPTY]
+        return room
+
+    def room_sources(self, room):
+        """xy coordinates of walkable cells of room, the order of sources in the stored fields."""
+        return [(x, y) for x in range(self.width) for y in range(self.height)
+                if room[y, x] != MAP_SYMBOLS[OBSTACLE]]
+
+    def source_index(self, sources):
+        index = np.full(shape=(self.height, self.width), fill_value=-1, dtype=np.int32)
+        for idx, (x, y) in enumerate(sources):
+            index[y, x] = idx
+        return index
+
+    def save_fields(self, data_folder, sources, rows):
+        """Streams fields to the store in data_folder in the layout and storage type of the loader.
+
+        The fields file is preallocated on disk and filled by chunks of chunk_size encoded rows, so peak
+        memory does not grow with the number of sources.
+
+        Args:
+            data_folder (str): Folder of the store.
+            sources (list): xy coordinates of source cells.
+            rows (iterable): np.array(height, width) SFF of each of sources, for the pairwise layout
+            distances of source i to sources[i:].
+
+        """
+        n = len(sources)
+        if self.pairwise:
+            store = PairwiseStore
+            shape = (n * (n + 1) // 2,)
+        else:
+            store = FieldStore
+            shape = (n, self.height, self.width)
+        os.makedirs(data_folder, exist_ok=True)
+        save_array_chunks(os.path.join(data_folder, store.fields_file(self.dtype)), shape, self.dtype,
+                          self.encoded_chunks(rows, n))
+        save_array(os.path.join(data_folder, store.INDEX_FILE), self.source_index(sources))
+
+    def encoded_chunks(self, rows, n):
+        """Flattened rows in the storage type concatenated by chunk_size of them."""
+        chunk = []
+        for idx, row in enumerate(rows):
+            if idx % 32 == 0:
+                print(idx + 1, "/", n)
+            chunk.append(encode_field(row, self.dtype).ravel())
+            if len(chunk) == self.chunk_size:
+                yield np.concatenate(chunk)
+                chunk = []
+        if chunk:
+            yield np.concatenate(chunk)
+
+    def source_fields(self, room, sources):
+        """Computes SFF of every source cell, in parallel if the process pool has more than one process.
+
+        Sources are split into chunks across the pool and the fields are yielded in the order of sources
+        as soon as they arrive, so the result is identical to a serial run. The wavefront backend
+        computes batches of batch_size sources in one stacked array instead of one field per task.
+
+        Args:
+            room (object): np.array(height, width) of map symbols without gate.
+            sources (list): xy coordinates of source cells.
+
+        Yields:
+            ((int, int), object): xy coordinates of source and its np.array(height, width) SFF.
+
+        """
+        if self.backend == "wavefront":
+            batches = [sources[i:i + self.batch_size] for i in range(0, len(sources), self.batch_size)]
+            compute = functools.partial(compute_source_fields_wavefront, room)
+            fields = (field for batch in self.pool_imap(compute, batches) for field in batch)
+            yield from zip(sources, fields)
+            return
+        compute = functools.partial(compute_source_field, room)
+        yield from zip(sources, self.pool_imap(compute, sources))
+
+    def source_pairs(self, room, sources):
+        """Computes distances of all pairs of source cells packed as in PairwiseStore.
+
+        The source with index i needs only distances to sources[i:], the rest is in the earlier rows.
+
+        Args:
+            room (object): np.array(height, width) of map symbols without gate.
+            sources (list): xy coordinates of source cells in the order of index.
+
+        Yields:
+            np.array(n - i) of float distances of the source i to sources[i:].
+
+        """
+        compute = functools.partial(compute_source_distances, room, sources)
+        yield from self.pool_imap(compute, range(len(sources)))
+
+    def pool_imap(self, compute, items):
+        """Results of compute for each of items in order, computed in the process pool if there is more than one."""
+        processes = self.processes or os.cpu_count() or 1
+        if processes == 1:
+            yield from map(compute, items)
+            return
+        # several chunks per process balance the load of items with different amount of work
+        chunksize = max(1, len(items) // (4 * processes))
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap(compute, items, chunksize)
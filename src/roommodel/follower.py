@@ -2,14 +2,16 @@ import mesa
 import numpy as np
 
 from .agent import Agent
-from .utils.portrayal import create_color
+from .utils.constants import AGENT_KIND
 
 
 class FollowerAgent(Agent):
+    __slots__ = ()
+    kind = AGENT_KIND.FOLLOWER
+
     def __init__(self, uid, model):
         super().__init__(uid, model)
         self.name = "Follower: " + self.name
-        self.color = create_color(self)
 
     def step(self) -> None:
         sff = self.model.sff["Follower"]
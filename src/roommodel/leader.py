@@ -1,8 +1,7 @@
 import mesa
 import numpy as np
 
-from .utils.portrayal import create_color
-from .utils.constants import KS, KO, KD, GAMMA, OCCUPIED_CELL
+from .utils.constants import AGENT_KIND, KS, KO, KD, GAMMA, OCCUPIED_CELL
 from .agent import Agent
 
 
@@ -12,9 +11,11 @@ class LeaderAgent(Agent):
     Does not update SFF.
 
     """
+    __slots__ = ()
+    kind = AGENT_KIND.LEADER
+
     def __init__(self, uid, model):
         super().__init__(uid, model)
-        self.color = create_color(self)
         self.name = "Leader: " + str(self.unique_id)
         self.nominal_movement_duration = self.model.leader_movement_duration
         self.movement_duration = self.nominal_movement_duration
@@ -55,16 +56,11 @@ class LeaderAgent(Agent):
             (int, (int, int)): SFF distance and xy coordinates of most distant agent.
 
         """
-        distances = []
         occupancy_grid = self.model.of
         virtual_leader_pos = self.model.virtual_leader.pos
-        for y, x in np.argwhere(occupancy_grid == OCCUPIED_CELL):
-            if (x, y) == self.pos:
-                continue
-            distances.append((self.dist(virtual_leader_pos, (x, y)), (x, y)))
-        distances = sorted(distances, key=lambda dist_pos: dist_pos[0], reverse=True)
-        if len(distances) > 0:
-            return distances[0]
+        positions = [(x, y) for y, x in np.argwhere(occupancy_grid == OCCUPIED_CELL) if (x, y) != self.pos]
+        if len(positions) > 0:
+            return self.model.sff.farthest(virtual_leader_pos, positions)
         else:
             return 0, self.pos
 
@@ -104,6 +100,8 @@ class VirtualLeader(LeaderAgent):
     Updates SFF.
 
     """
+    kind = AGENT_KIND.VIRTUAL_LEADER
+
     def __init__(self, uid, model):
         super().__init__(uid, model)
         self.name = "Virtual " + self.name
@@ -119,10 +117,9 @@ class VirtualLeader(LeaderAgent):
 
         """
         self.reset()
-        cells = self.model.grid.get_neighborhood(self.pos, include_center=True, moore=True)
         sff = self.model.sff["Virtual leader"]
-        attraction = self.attraction(sff, cells)
-        coords = self.deterministic_choice(attraction)
+        cells, attraction = self.moore_attraction(sff)
+        coords = self.deterministic_choice(dict(zip(cells, attraction)))
         cell = self.model.grid[coords[0]][coords[1]][0]
         self.next_cell = cell
         self.adapt_speed()
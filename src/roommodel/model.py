@@ -1,4 +1,3 @@
-import copy
 import logging
 import os
 logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
@@ -9,8 +8,10 @@ import mesa
 from .goal import Goal
 from .scheduler import SequentialActivation
 from .file_loader import FileLoader
+from .walkability import Walkability
 from .utils.room import normalize_grid
-from .utils.constants import AREA_STATIC_BOOSTER, OCCUPIED_CELL, ORIENTATION
+from .utils.constants import FOLLOWER_KINDS, OCCUPIED_CELL, ORIENTATION, RANDOM_BLOCK_SIZE
+from .utils.stream import UniformStream
 from .utils.algorithms import pair_positions
 from .directed import DirectedAgent
 from .partner import DirectedPartnerAgent
@@ -27,6 +28,7 @@ class RoomModel(mesa.Model):
         grid (object): Rectangular grid of positions where agents and cells are located.
         gate (int, int): xy coordinates of the gate.
         room (object): np.array(height, width) floats that defines topology - walls, obstacles.
+        walkability (object): Walkability of moves and maneuvers from each cell of the room.
         sff (object): np.array(height, width) floats of SFF values in the room.
         of (object): np.array(height, width) floats of occupancy of cells in the room.
         cell_gate (object): Cell which is in the position of the gate.
@@ -34,12 +36,20 @@ class RoomModel(mesa.Model):
         leader (object): LeaderAgent object is physical leader moving and locally influencing agents.
         virtual_leader (object): VirtualLeaderAgent object is non-physical leader that updates SFF for navigation based
         on current goals.
+        rng (object): np.random.Generator of the model seeded by seed, every stochastic decision uses it.
+        uniforms (object): UniformStream of rng which hands out uniform numbers for decisions and conflicts.
+        leader_distances (dict): unique_id(key) and (xy coordinates, distance to leader, discipline)(value) of agents
+        at the start of the tick, see leader_distances_update.
+        leader_distances_goal (int, int): xy coordinates of the leader when leader_distances were resolved.
 
     """
 
     def __init__(self, ks, ko, kd, leader_movement_duration, agent_movement_duration, penalization_orientation,
-                 leader_front_location_switch, fileloader):
+                 leader_front_location_switch, fileloader, batched_decisions=True, seed=None):
         super().__init__()
+        # the same seed reproduces the run, mesa seeds its random from the seed keyword too
+        self.rng = np.random.default_rng(seed)
+        self.uniforms = UniformStream(self.rng, RANDOM_BLOCK_SIZE)
         self.file_loader = fileloader
         self.ks = ks
         self.ko = ko
@@ -50,13 +60,16 @@ class RoomModel(mesa.Model):
         self.leader_front_location_switch = leader_front_location_switch
         self.filename = self.file_loader.get_filename()
         self.dimensions = self.file_loader.dimensions()
-        self.schedule = SequentialActivation(self)
+        self.schedule = SequentialActivation(self, batched_decisions)
         self.grid = mesa.space.MultiGrid(*self.dimensions, torus=False)
         self.gate = self.file_loader.get_gate()
         self.room = self.file_loader.get_room()
+        self.walkability = Walkability(self.room)
         self.goals = self.file_loader.get_goals(self)
         self.sff = self.file_loader.get_sff()
         self.of = self.file_loader.get_room()
+        self.leader_distances = {}
+        self.leader_distances_goal = None
         self.uid_ctr = 0
         self.n_evacuated_followers = 0
         self.n_evacuated_leaders = 0
@@ -89,8 +102,8 @@ class RoomModel(mesa.Model):
         """Solves the pairing of DirectedAgents and replaces the objects in the schedule."""
         # occupancy grid for solitary DirectedAgents
         grid = np.zeros(shape=self.dimensions)
-        for agent in self.schedule.agents:
-            if agent.partner is None and agent.name.startswith("Follower"):
+        for agent in self.schedule.agents_of(*FOLLOWER_KINDS):
+            if agent.partner is None:
                 grid[agent.pos] = OCCUPIED_CELL
         # solve the problem by iteratively decrementing highest vertex degrees until solution
         positions = pair_positions(grid)
@@ -236,18 +249,45 @@ class RoomModel(mesa.Model):
             focus += 1
         if not interest_area:
             raise ValueError("Missing area of interest for SFF.")
-        bonus_mask = np.ones_like(self.room) * AREA_STATIC_BOOSTER
-        tl_x, tl_y = interest_area[0]
-        rb_x, rb_y = interest_area[1]
-        bonus_mask[rb_y:tl_y + 1, tl_x:rb_x + 1] = 0
-        # center of area
-        coords = ((rb_x - tl_x) // 2 + tl_x, (rb_y - tl_y) // 2 + tl_y)
-        static_field = copy.deepcopy(self.sff[coords])
-        static_field = static_field * bonus_mask
+        # distance to the nearest cell of the area, cached by the file loader
+        static_field = self.file_loader.area_field(interest_area)
         if normalize:
             return normalize_grid(static_field)
         return static_field
 
+    def leader_goal(self):
+        """xy coordinates of the leader, the gate if the leader has evacuated."""
+        if self.leader.pos is None:
+            return self.gate
+        return self.leader.pos
+
+    def leader_distances_update(self, agents=None):
+        """Resolve distance to the leader and discipline of agents at once from one field of the leader.
+
+        Agents and the leader keep their positions until the cells move them at the end of the tick, agents read
+        their values in Agent.leader_dist and Agent.discipline during the tick. The other agents compute them.
+
+        Args:
+            agents (list): Agents to resolve, all scheduled agents if None.
+
+        """
+        goal = self.leader_goal()
+        if agents is None:
+            agents = self.schedule.agents
+        agents = [agent for agent in agents if agent.pos is not None]
+        self.leader_distances = {}
+        self.leader_distances_goal = goal
+        if not agents:
+            return
+        positions = [agent.pos for agent in agents]
+        distances = self.sff.distances(goal, positions)
+        # discipline is higher close to the leader, same as Agent.discipline
+        rows = np.array([agent.row for agent in agents])
+        disciplined = self.schedule.states.followers(rows) & (distances > 0)
+        disciplines = np.where(disciplined, 1 + 1 / np.where(disciplined, distances, 1), 1)
+        for agent, pos, distance, discipline in zip(agents, positions, distances.tolist(), disciplines.tolist()):
+            self.leader_distances[agent.unique_id] = pos, distance, discipline
+
     def generate_uid(self):
         """Generates unique id for each agent."""
         self.uid_ctr += 1
@@ -2,22 +2,45 @@ import mesa
 import numpy as np
 
 from .directed import DirectedAgent
-from .utils.constants import ORIENTATION, MANEUVERS, KO, KS
+from .utils.constants import AGENT_KIND, ORIENTATION, ORIENTATIONS, MANEUVER_OFFSETS, MANEUVER_ORIENTATIONS, KO, KS
 from .utils.portrayal import create_color
 from .utils.algorithms import dist
 
 
+def maneuver(positions, orientations, idx):
+    """Maneuver idx of arrays of DirectedPartnerAgent.maneuver_attraction as (leader, partner) tuples.
+
+    Returns:
+        ((int, int), ORIENTATION), ((int, int), ORIENTATION): xy coordinates and orientation of leader and partner.
+
+    """
+    (leader, partner), (leader_orientation, partner_orientation) = positions[idx].tolist(), orientations[idx]
+    return (tuple(leader), ORIENTATIONS[leader_orientation]), (tuple(partner), ORIENTATIONS[partner_orientation])
+
+
 class DirectedPartnerAgent(DirectedAgent):
     """Paired agent with orientation. Can be solitary when partner evacuates.
 
     Attributes:
-        leader (bool): Indicator of agent being in charge of all processes.
+        leader (bool): Indicator of agent being in charge of all processes, a view over states.leader.
     """
+    __slots__ = ()
+    kind = AGENT_KIND.FOLLOWER_PAIR
+    batched_decision = False
+
     def __init__(self, uid, model, ):
         super().__init__(uid, model)
         self.name = "Follower Pair: " + self.name
         self.leader = True
 
+    @property
+    def leader(self):
+        return bool(self.states.leader[self.row])
+
+    @leader.setter
+    def leader(self, leader):
+        self.states.leader[self.row] = leader
+
     def step(self):
         """Leader stochastically selects next step for both agents. Updates leadership based on position in pair,
          partner does nothing."""
@@ -43,10 +66,13 @@ class DirectedPartnerAgent(DirectedAgent):
         """
         if not self.partner:
             return super().select_cell(sff)
-        # cells are empty because attraction method inserts positions from maneuvers
-        cells = [[], []]
-        attraction = self.attraction(sff, cells)
-        leader, partner = self.stochastic_choice(attraction)
+        positions, orientations, attraction = self.maneuver_attraction(sff)
+        idx = self.stochastic_index(attraction)
+        if idx is None:
+            leader, partner = (self.pos, self.orientation), (self.partner.pos, self.orientation)
+        else:
+            leader, partner = maneuver(positions, orientations, idx)
+            self.model.datacollector.incorrect_orientation_selected(self.unique_id, (leader, partner))
         coords, orientation = leader
         p_coords, p_orientation = partner
         leader_cell = self.model.grid._grid[coords[0]][coords[1]][0]
@@ -66,7 +92,7 @@ class DirectedPartnerAgent(DirectedAgent):
 
         Args:
             sff (object):  np.array(height, width) of float static field values.
-            cells (list): Empty list, positions will be inserted from maneuvers.
+            cells (list): Not used by pairs, positions are given by maneuvers.
 
         Returns:
             dict: (leader:((int, int), ORIENTATION), partner)(key) and attraction(value).
@@ -74,102 +100,58 @@ class DirectedPartnerAgent(DirectedAgent):
         """
         if self.partner is None:
             return super().attraction(sff, cells)
-        # Calculate real coordinates from maneuver offset
-        maneuvers = self.offset_maneuvers()
-        for leader, partner in maneuvers:
-            cells[0].append(leader[0])
-            cells[1].append(partner[0])
-        # influence of discipline is already calculated in attractions
-        leader_attraction = super(DirectedPartnerAgent, self).attraction(sff, cells[0])
-        partner_attraction = super(DirectedPartnerAgent, self.partner).attraction(sff, cells[1])
-        attraction = {}
-        for leader, partner in maneuvers:
-            coords, _ = leader
-            p_coords, _ = partner
-            penalization = 0
-            # cross obstacle penalization toggles if any agent crosses obstacle
-            if self.cross_obstacle(leader[0]) or self.partner.cross_obstacle(partner[0]):
-                penalization = self.penalization_cross_obstacle
-            # if any agent has zero attraction the movement is forbidden
-            if leader_attraction[coords] == 0 or partner_attraction[p_coords] == 0:
-                attraction[(leader, partner)] = 0
-            else:
-                attraction[(leader, partner)] = (1-penalization) * (leader_attraction[coords] + partner_attraction[p_coords])
-
-        # calculating correct orientation in next move
-        top_maneuver = (float("-inf"), None)
-        for key in attraction:
-            if attraction[key] > top_maneuver[0]:
-                top_maneuver = (attraction[key], key)
-        _, top_key = top_maneuver
-        top_orientation = top_key[0][1]
-        # orientation penalization
-        incorrect_maneuvers = {}
-        correct_orientation = 0
-        distance_to_leader = min(self.leader_dist(), self.partner.leader_dist())
-        if distance_to_leader > 0:
-            incorrect_orientation_penalization = ((1/distance_to_leader) ** 0.5) * self.penalization_orientation
-        else:
-            incorrect_orientation_penalization = correct_orientation
-        for key in attraction:
-            _, next_orientation = key[0]
-            # maneuver results in correct orientation, do not penalize
-            penalization = correct_orientation
-            if next_orientation != top_orientation:
-                # maneuver results in incorrect orientation, penalize
-                # smalled distance_to_leader results in higher penalization value
-                # higher penalization value makes the maneuver less probable
-                penalization = incorrect_orientation_penalization
-                incorrect_maneuvers[key] = (penalization, distance_to_leader)
-            # apply penalization to each maneuver
-            attraction[key] = attraction[key] * (1 - penalization)
-
-        # normalize to make probability
-        normalize = sum(attraction.values())
-        for key in attraction:
-            attraction[key] /= normalize
-
-        if distance_to_leader > 0:
-            self.model.datacollector.incorrect_orientation(self.unique_id, incorrect_maneuvers)
-        return attraction
+        positions, orientations, attraction = self.maneuver_attraction(sff)
+        return {maneuver(positions, orientations, idx): attraction[idx] for idx in range(len(attraction))}
 
-    def maneuver_out_of_bounds(self, maneuver):
-        """Indicator of maneuver resulting in position outside dimensions of the room.
+    def maneuver_attraction(self, sff):
+        """Calculate attraction of each maneuver of the pair with penalisation, at once for all maneuvers.
 
         Args:
-            maneuver (int, int): xy coordinates of the position.
-
-        Returns:
-            bool: Maneuver is out of dimensions of the room.
-
-        """
-        width, height = self.model.dimensions
-        x, y = maneuver
-        if 0 <= x < width and 0 <= y < height:
-            return False
-        return True
-
-    def offset_maneuvers(self):
-        """Calculates real coordinates of maneuver from maneuver offset of leader and partner.
+            sff (object):  np.array(height, width) of float static field values.
 
         Returns:
-            list: (leader_xy, leader_orientation), (partner_xy, partner_orientation)
+            (np.array, np.array, np.array): np.array(n, 2, 2) of xy coordinates of leader and partner after
+            maneuvers in the room, np.array(n, 2) of their int orientations and np.array(n) of attraction.
 
         """
-        leader_pos = self.pos
-        maneuvers = []
-        for move in MANEUVERS[self.orientation]:
-            leader_offset, leader_orientation = move[0]
-            partner_offset, partner_orientation = move[1]
-
-            leader_move = leader_pos[0] + leader_offset[0], leader_pos[1] + leader_offset[1]
-            partner_move = leader_pos[0] + partner_offset[0], leader_pos[1] + partner_offset[1]
-            if self.maneuver_out_of_bounds(leader_move) or self.maneuver_out_of_bounds(partner_move):
-                continue
-            offset_move = (leader_move, leader_orientation), (partner_move, partner_orientation)
-
-            maneuvers.append(offset_move)
-        return maneuvers
+        # maneuvers of both agents into the grid, the rest is forbidden but counts in normalization of attraction
+        in_grid, feasible, crosses = self.model.walkability.maneuver_masks(self.orientation, self.pos)
+        positions = MANEUVER_OFFSETS[self.orientation][in_grid] + self.pos
+        orientations = MANEUVER_ORIENTATIONS[self.orientation][in_grid]
+        leader_xs, leader_ys = positions[:, 0, 0], positions[:, 0, 1]
+        partner_xs, partner_ys = positions[:, 1, 0], positions[:, 1, 1]
+        # influence of discipline is already calculated in attractions
+        leader_attraction = super(DirectedPartnerAgent, self).cells_attraction(sff, leader_xs, leader_ys)
+        partner_attraction = super(DirectedPartnerAgent, self.partner).cells_attraction(sff, partner_xs, partner_ys)
+        # cross obstacle penalization toggles if any agent crosses obstacle
+        penalization = np.where(crosses[in_grid], self.penalization_cross_obstacle, 0)
+        # movement into an obstacle or a cell with zero attraction of any agent is forbidden
+        forbidden = ~feasible[in_grid] | (leader_attraction == 0) | (partner_attraction == 0)
+        attraction = np.where(forbidden, 0, (1 - penalization) * (leader_attraction + partner_attraction))
+
+        # calculating correct orientation in next move, the first of the most attractive maneuvers
+        top_orientation = orientations[np.nanargmax(attraction), 0]
+        # orientation penalization
+        distance_to_leader = min(self.leader_dist(), self.partner.leader_dist())
+        if distance_to_leader > 0:
+            incorrect_orientation_penalization = ((1/distance_to_leader) ** 0.5) * self.penalization_orientation
+        else:
+            incorrect_orientation_penalization = 0
+        # maneuver results in incorrect orientation, penalize
+        # smalled distance_to_leader results in higher penalization value
+        # higher penalization value makes the maneuver less probable
+        incorrect = orientations[:, 0] != top_orientation
+        attraction = attraction * (1 - np.where(incorrect, incorrect_orientation_penalization, 0))
+
+        # normalize to make probability, the sum accumulates in the order of maneuvers
+        attraction /= np.cumsum(attraction)[-1]
+
+        if distance_to_leader > 0 and self.model.datacollector.tracks_incorrect_orientation():
+            incorrect_maneuvers = {maneuver(positions, orientations, idx): (incorrect_orientation_penalization,
+                                                                             distance_to_leader)
+                                   for idx in np.flatnonzero(incorrect)}
+            self.model.datacollector.incorrect_orientation(self.unique_id, incorrect_maneuvers)
+        return positions, orientations, attraction
 
     def update_leader(self):
         """Update leadership in the pair based on the positions and orientation."""
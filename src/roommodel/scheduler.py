@@ -1,61 +1,132 @@
 import mesa
 
 from .cell import Cell
+from .directed import DirectedAgent
+from .states import AgentStates
+from .utils.constants import AGENT_KIND
 
 
 class SequentialActivation(mesa.time.BaseScheduler):
     """Scheduler with adaptive time spand and sequential activation of agents.
 
+    Agents wait for their tick in states, a step touches only the agents due in the tick and the agents
+    bound to them, so ticks in which everybody waits cost almost nothing.
+
     Attributes:
         _agents (dict): unique_id(key), Agent(value) which is updated every step.
         _cells (dict): unique_id(key), Cell(value) which is updated every step if occupied.
         removed_agents (dict): unique_id(key), Agent(value) for preserving agents after evacuation.
+        kinds (dict): AGENT_KIND(key), dict of unique_id(key), Agent(value) of scheduled agents of the kind(value).
+        states (AgentStates): Columns of state of all agents, rows are views of the agent objects.
         steps (int): Model step increments by 1.
         time (int): Timestep clock increments by 2 per model step. Used to schedule agents and control speed.
+        bound (list): Agents which kept a bond or a selected cell after the last step and must advance again.
+        added (int): Number of additions to the schedule, orders the agents.
+        batched (bool): Solitary agents select their cells at once before the others, see DirectedAgent.select_cells.
+        It changes the order of random numbers, False reproduces the runs of sequential selection.
 
     """
-    def __init__(self, model: mesa.Model) -> None:
+    def __init__(self, model: mesa.Model, batched: bool = True) -> None:
         super().__init__(model)
+        self.batched = batched
         self._cells: dict[int, Cell] = {}
         self.removed_agents: dict[int, mesa.Agent] = {}
+        self.states = AgentStates()
+        self.kinds: dict[AGENT_KIND, dict[int, mesa.Agent]] = {kind: {} for kind in AGENT_KIND}
+        self.bound: list[mesa.Agent] = []
+        self.added = 0
 
     def add(self, agent: mesa.Agent) -> None:
         """Add agent to the schedule."""
         if agent.unique_id in self._agents:
             return
         self._agents[agent.unique_id] = agent
+        self.kinds[agent.kind][agent.unique_id] = agent
+        self.states.active[agent.row] = True
+        self.states.order[agent.row] = self.added
+        self.states.wake(agent.row, agent.tau)
+        self.added += 1
 
     def step(self) -> None:
-        """Check all agents if they can enter the timestep and activate them. Activate occupied cells."""
+        """Activate agents due in the timestep and occupied cells, then advance the agents bound to them."""
         self._cells = {}
         # Only agents with time in the timestep window are activated.
-        running_agents = {}
-        for agent in self._agents.values():
-            if agent.allow_entrance():
-                running_agents[agent.unique_id] = agent
+        activated = [self.states.agents[row] for row in self.states.due(self.time)]
+        running_agents = {agent.unique_id: agent for agent in activated}
+        if activated:
+            # distances to the leader hold until agents move at the end of the step
+            self.model.leader_distances_update(activated)
 
         # reset states, select next_cell
+        if self.batched:
+            batch = [agent for agent in running_agents.values() if agent.batched_decision]
+            if batch:
+                DirectedAgent.select_cells(self.model, batch)
+            running_agents = {uid: agent for uid, agent in running_agents.items() if not agent.batched_decision}
         for agent in running_agents.values():
             agent.step()
         # select winner, solve conflicts
         for cell in self._cells.values():
             cell.step()
         # confirm move, adapt speed
-        for agent in self._agents.values():
+        advancing = self.advancing_agents(activated)
+        for agent in advancing:
             agent.advance()
         # move agents, update states
         for cell in self._cells.values():
             cell.advance()
+        self.bound = [agent for agent in advancing if agent.next_cell is not None or agent.head is not None
+                      or agent.tail is not None]
 
         self.steps += 1
+        # the clock does not jump to the next due tick, goals, pairing and data collection run in every model step
         self.time += 2
 
+    def advancing_agents(self, running_agents):
+        """Agents whose advance has an effect in this step, in the order of the schedule.
+
+        Advance of the other agents only confirms there is nothing to cancel. Agents bound to others are the ones
+        which ran, occupants of the cells they compete for, agents which kept a bond from earlier steps and partners
+        of all of them.
+
+        Args:
+            running_agents (iterable): Agents activated in this step.
+
+        Returns:
+            list: Scheduled agents to advance.
+
+        """
+        candidates = list(running_agents) + self.bound
+        candidates += [cell.agent for cell in self._cells.values() if cell.agent is not None]
+        candidates += [agent.partner for agent in candidates if agent.partner is not None]
+        advancing = {}
+        for agent in candidates:
+            # replaced and evacuated agents are not advanced
+            if self._agents.get(agent.unique_id) is agent:
+                advancing[agent.row] = agent
+        rows = sorted(advancing, key=self.states.order.__getitem__)
+        return [advancing[row] for row in rows]
+
     def add_cell(self, cell: Cell):
         self._cells[cell.unique_id] = cell
 
     def remove_agent(self, agent: mesa.Agent):
         self.removed_agents[agent.unique_id] = agent
         del self._agents[agent.unique_id]
+        del self.kinds[agent.kind][agent.unique_id]
+        self.states.active[agent.row] = False
+
+    def agents_of(self, *kinds):
+        """Scheduled agents of the kinds, in the order of kinds and of addition within a kind.
+
+        Args:
+            kinds (AGENT_KIND): Kinds of the agents.
+
+        Returns:
+            list: Agents of the kinds.
+
+        """
+        return [agent for kind in kinds for agent in self.kinds[kind].values()]
 
     def get_agents(self):
         return self._agents
@@ -0,0 +1,99 @@
+import heapq
+
+import numpy as np
+
+from .utils.constants import AGENT_KIND
+
+
+class AgentStates:
+    """State of all agents of the model in typed columns, one row per agent object.
+
+    Agents are thin views over their row, see Agent. Batched code reads and writes whole columns.
+    Rows are never reused, agents removed from the schedule or replaced by a new object keep their state.
+
+    Rows wait in a heap keyed by tau until the tick they can move again, then stay in the ready set until
+    they move. Agents due in a tick are found without touching the agents which wait, see due.
+
+    Attributes:
+        size (int): Number of allocated rows.
+        agents (list): Agent object of each row.
+        x (object): np.array(capacity) of int32 x coordinate of the position, -1 without position.
+        y (object): np.array(capacity) of int32 y coordinate of the position, -1 without position.
+        kind (object): np.array(capacity) of int8 AGENT_KIND of the agent.
+        orientation (object): np.array(capacity) of int8 ORIENTATION of directed agents.
+        tau (object): np.array(capacity) of int64 timestep after the last move.
+        movement_duration (object): np.array(capacity) of int64 duration of the next move.
+        partner (object): np.array(capacity) of int32 row of the partner, -1 for solitary agents.
+        leader (object): np.array(capacity) of bool leadership in a pair.
+        active (object): np.array(capacity) of bool, the agent is in the schedule.
+        order (object): np.array(capacity) of int64 order of addition to the schedule.
+        wakeups (list): Heap of (tau, row) of rows waiting for their tick, stale entries are skipped.
+        ready (set): Rows with tau in the past which did not move since.
+
+    """
+    columns = {"x": (np.int32, -1),
+               "y": (np.int32, -1),
+               "kind": (np.int8, 0),
+               "orientation": (np.int8, 0),
+               "tau": (np.int64, 0),
+               "movement_duration": (np.int64, 0),
+               "partner": (np.int32, -1),
+               "leader": (np.bool_, True),
+               "active": (np.bool_, False),
+               "order": (np.int64, -1)}
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.agents = []
+        self.wakeups = []
+        self.ready = set()
+        for name, (dtype, default) in self.columns.items():
+            setattr(self, name, np.full(shape=capacity, fill_value=default, dtype=dtype))
+
+    def __len__(self):
+        return self.size
+
+    def allocate(self, agent):
+        """Row with default state for agent, the columns grow twice if full."""
+        if self.size == len(self.tau):
+            for name, (dtype, default) in self.columns.items():
+                column = getattr(self, name)
+                setattr(self, name, np.concatenate((column, np.full_like(column, default))))
+        self.agents.append(agent)
+        self.size += 1
+        return self.size - 1
+
+    def wake(self, row, tau):
+        """Schedule row for the tick tau, called whenever tau of the row changes."""
+        heapq.heappush(self.wakeups, (tau, row))
+
+    def due(self, time):
+        """Rows of the agents in the schedule allowed to move in timestep time, in the order of the schedule.
+
+        Agent is allowed if its tau is not after time, an agent in pair only together with its partner.
+        The cost is proportional to the agents with tau in the past.
+
+        Args:
+            time (int): Timestep of the schedule.
+
+        Returns:
+            list: int rows of the agents.
+
+        """
+        wakeups = self.wakeups
+        while wakeups and wakeups[0][0] <= time:
+            self.ready.add(heapq.heappop(wakeups)[1])
+        if not self.ready:
+            return []
+        rows = np.fromiter(self.ready, dtype=np.int64, count=len(self.ready))
+        # rows which moved wait in the heap again, removed agents never come back
+        waiting = (self.tau[rows] > time) | ~self.active[rows]
+        self.ready.difference_update(rows[waiting].tolist())
+        rows = rows[~waiting]
+        partner = self.partner[rows]
+        rows = rows[(partner < 0) | (self.tau[partner] <= time)]
+        return rows[np.argsort(self.order[rows], kind="stable")].tolist()
+
+    def followers(self, rows):
+        """np.array(len(rows)) of bool, agents of the rows are followers, see AGENT_KIND.is_follower."""
+        return self.kind[rows] >= AGENT_KIND.FOLLOWER
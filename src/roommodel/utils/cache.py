@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Size-bounded mapping which evicts the least recently used item.
+
+    Attributes:
+        maxsize (int): Maximal number of cached items.
+        items (OrderedDict): Cached key(any) and value(any), the least recently used first.
+        hits (int): Number of lookups which found the key.
+        misses (int): Number of lookups which did not find the key.
+
+    """
+    def __init__(self, maxsize=128):
+        if maxsize < 1:
+            raise ValueError("Cache size must be at least 1.")
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __repr__(self):
+        return self.__class__.__name__ + " " + str(len(self)) + "/" + str(self.maxsize) + \
+            " hits: " + str(self.hits) + " misses: " + str(self.misses)
+
+    def get(self, key, default=None):
+        """Value of key marked as the most recently used, default if the key is not cached."""
+        if key in self.items:
+            self.hits += 1
+            self.items.move_to_end(key)
+            return self.items[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Insert value as the most recently used and evict the least recently used item if full."""
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0
+        return self.hits / lookups
@@ -47,8 +47,30 @@ class ORIENTATION(IntEnum):
         return ORIENTATION((self + shift) % len(ORIENTATION))
 
 
-AREA_STATIC_BOOSTER = 1.1
+# orientation members indexed by value, faster than calling the enum
+ORIENTATIONS = list(ORIENTATION)
+
+
+class AGENT_KIND(IntEnum):
+    CELL = 0
+    LEADER = 1
+    VIRTUAL_LEADER = 2
+    FOLLOWER = 3
+    FOLLOWER_PAIR = 4
+
+    def __repr__(self):
+        return self.name
+
+    def is_follower(self):
+        return self >= AGENT_KIND.FOLLOWER
+
+
+# solitary followers and followers in pairs, including the ones whose partner evacuated
+FOLLOWER_KINDS = (AGENT_KIND.FOLLOWER, AGENT_KIND.FOLLOWER_PAIR)
+
 PAIR_DISTANCE_THRESHOLD = 2.0
+# doors of hierarchical SFF are gaps in walls at most this wide
+MAX_DOOR_WIDTH = 5
 
 MAX_GROUPS = 10
 GATE = "G"
@@ -75,10 +97,27 @@ MAP_VALUES = {v: k for k, v in MAP_SYMBOLS.items()}
 
 EMPTY_CELL = 0
 OCCUPIED_CELL = 1
+# 1 for diagonal moves in the 3x3 neighbourhood indexed [dy + 1, dx + 1]
+MOORE_DIAGONAL = np.array([[1, 0, 1],
+                           [0, 0, 0],
+                           [1, 0, 1]])
+# xy offsets of the 8 moves to the Moore neighbourhood, x-major as get_neighborhood, bit k is the move k
+MOORE_MOVES = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx != 0 or dy != 0])
 
 SFF_MAX_FREE = 1
 SFF_MIN_FREE = 0
 SFF_OBSTACLE = float("inf")
+# compact storage of SFF as uint16 in steps of 0.01 cell, the largest value marks obstacles
+SFF_QUANTIZATION_STEP = 0.01
+SFF_QUANTIZED_OBSTACLE = np.iinfo(np.uint16).max
+SFF_STORAGE_TYPES = [np.float64, np.float32, np.float16, np.uint16]
+# algorithms of SFF computation, heap based Dijkstra per source or NumPy wavefront sweeps over a batch of sources
+SFF_BACKENDS = ["dijkstra", "wavefront"]
+# part of the key of stored SFF, increase when the computed fields change
+SFF_ALGORITHM_VERSION = 1
+
+# uniform numbers drawn from the generator of the model at once
+RANDOM_BLOCK_SIZE = 1024
 
 KS = 0
 KO = 1
@@ -249,4 +288,31 @@ def maneuvers():
     return maneuvers
 
 
+def compile_maneuvers(maneuvers):
+    """Maneuvers of each orientation as arrays.
+
+    Args:
+        maneuvers (dict): ORIENTATION(key) and list of (leader, partner, cost) maneuvers(value) as in MANEUVERS.
+
+    Returns:
+        (dict, dict): ORIENTATION(key) and np.array(n_maneuvers, 2, 2) of xy offsets of leader and partner
+        from the leader's position, ORIENTATION(key) and np.array(n_maneuvers, 2) of int orientations
+        of leader and partner after the maneuver, in the order of maneuvers.
+
+    """
+    offsets = {}
+    orientations = {}
+    for orientation, moves in maneuvers.items():
+        offsets[orientation] = np.array([[leader[0], partner[0]] for leader, partner, _ in moves])
+        orientations[orientation] = np.array([[leader[1], partner[1]] for leader, partner, _ in moves])
+    return offsets, orientations
+
+
+# xy offset of the partner from the leader in a pair, same as DirectedPartnerAgent.partner_coords
+PARTNER_OFFSETS = {ORIENTATION.NORTH: (1, 0),
+                   ORIENTATION.EAST: (0, -1),
+                   ORIENTATION.SOUTH: (-1, 0),
+                   ORIENTATION.WEST: (0, 1)}
+
 MANEUVERS = maneuvers()
+MANEUVER_OFFSETS, MANEUVER_ORIENTATIONS = compile_maneuvers(MANEUVERS)
@@ -1,3 +1,6 @@
+from .constants import AGENT_KIND
+
+
 def hex_to_rgb(value):
     """Return (red, green, blue) for the color given as #rrggbb."""
     value = value.lstrip('#')
@@ -12,13 +15,13 @@ def rgb_to_hex(red, green, blue) -> str:
 
 def create_color(agent, hex=True):
     color = [0, 0, 0]
-    if agent.name.startswith("Cell"):
+    if agent.kind == AGENT_KIND.CELL:
         color = [0, 255, 128]
-    if agent.name.startswith("Leader"):
+    if agent.kind == AGENT_KIND.LEADER:
         color = [255, 0, 0]
-    if agent.name.startswith("Follower"):
+    if agent.kind.is_follower():
         color = [0, 0, 255]
-    if agent.name.startswith("Follower Pair"):
+    if agent.kind == AGENT_KIND.FOLLOWER_PAIR:
         # paired agents have same color
         hash_value = hash(agent.name)
         r = hash_value % 256
@@ -40,7 +43,7 @@ def agent_portrayal(agent):
         "text": agent.pos,
         "text_color": "black"
     }
-    if agent.name.startswith("Leader"):
+    if agent.kind == AGENT_KIND.LEADER:
         portrayal = {
             "Shape": "circle",
             "Color": agent.color,
@@ -54,7 +57,7 @@ def agent_portrayal(agent):
         }
         return portrayal
 
-    if agent.name.startswith("Virtual"):
+    if agent.kind == AGENT_KIND.VIRTUAL_LEADER:
         portrayal = {
             "Shape": "circle",
             "Color": "White",
@@ -68,7 +71,7 @@ def agent_portrayal(agent):
         }
         return portrayal
 
-    if agent.name.startswith("Follower"):
+    if agent.kind.is_follower():
         portrayal = {
             "Shape": "arrowHead",
             "scale": 1,
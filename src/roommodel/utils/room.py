@@ -1,38 +1,10 @@
-from queue import PriorityQueue
-from dataclasses import dataclass
-from math import ceil, log
+import heapq
+from collections import deque
 
 import numpy as np
-from .constants import MAP_SYMBOLS, MAP_VALUES
+from .constants import MAP_SYMBOLS, MAP_VALUES, GATE, MAX_DOOR_WIDTH, SFF_BACKENDS
 
-
-@dataclass
-class Node:
-    coords: (int, int)
-    obstacle: bool
-    price: int = float("inf")
-    visited: bool = False
-
-    def enter(self, parent):
-        self.price = parent.price + self.distance(parent)
-
-    def distance(self, other):
-        sigma = np.power(self.coords[0] - other.coords[0], 2)
-        sigma += np.power(self.coords[1] - other.coords[1], 2)
-        return np.sqrt(sigma)
-
-    def neighbours(self, width, height):
-        valid_coords = []
-        for x in [-1, 0, 1]:
-            for y in [-1, 0, 1]:
-                if 0 <= self.coords[0] + x < width and 0 <= self.coords[1] + y < height:
-                    if x == 0 and y == 0:
-                        continue
-                    valid_coords.append((self.coords[0] + x, self.coords[1] + y))
-        return valid_coords
-
-    def __lt__(self, other):
-        return self.price < other.price
+DIAGONAL_PRICE = float(np.sqrt(2))
 
 
 def create_grid(width, height, gate=None):
@@ -84,53 +56,381 @@ def normalize_grid(static_field):
     return static_field / np.nanmax(static_field[static_field != np.inf])
 
 
-def compute_static_field(grid, normalize=False):
-    q = PriorityQueue()
-    grid_nodes = []
-    gate = None
+def pad_walkable(grid):
+    """Flat mask of walkable cells padded with one obstacle cell on every side.
+
+    The padding guarantees that every Moore neighbour of a walkable cell is a valid
+    flat index, so the kernel needs no bounds checks.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+
+    Returns:
+        np.array((height + 2) * (width + 2)) of bool walkability.
+
+    """
     height, width = grid.shape
-    for y in range(height):
-        grid_nodes.append([])
-        for x in range(width):
-            coords = (x, y)
-            np_coords = (y, x)
-            node = Node(coords, grid[np_coords] < 0)
-            if grid[np_coords] == 100:
-                gate = Node(coords, False)
-                node = gate
-            grid_nodes[y].append(node)
+    walkable = np.zeros(shape=(height + 2, width + 2), dtype=bool)
+    walkable[1:-1, 1:-1] = grid >= 0
+    return walkable.ravel()
 
-    if not gate:
-        raise ValueError("Gate is not present in the map. Can't compute static field.")
 
-    gate.price = 0
-    q.put(gate)
-    cnt = 0
-    closest_2power = int(ceil(log(width*height) / log(2)))
-    closest_2mod = 2**closest_2power
-    while q.qsize() > 0:
-        cnt += 1
-        if cnt % closest_2mod == 0:
-            print(q.qsize(), cnt)
-        current_node = q.get()
-        current_node.visited = True
-        while current_node.obstacle:
-            current_node = q.pop()
-        for coords in current_node.neighbours(width, height):
-            x, y = coords
-            other_node = grid_nodes[y][x]
-            if not other_node.obstacle:
-                if not other_node.visited:
-                    other_node.visited = True
-                    distance = current_node.distance(other_node)
-                    if current_node.price + distance < other_node.price:
-                        other_node.enter(current_node)
-                        q.put(other_node)
-    static_field = np.zeros(grid.shape)
-    for x in range(width):
-        for y in range(height):
-            np_coords = (y, x)
-            static_field[np_coords] = grid_nodes[y][x].price
+def moore_offsets(width):
+    """Flat index offsets and prices of the 8 Moore neighbours in a grid of width.
+
+    Args:
+        width (int): Width of the (padded) grid.
+
+    Returns:
+        (np.array, np.array): int offsets and float prices, 1 for straight and sqrt(2) for diagonal steps.
+
+    """
+    steps = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1] if dx != 0 or dy != 0]
+    offsets = np.array([dy * width + dx for dx, dy in steps])
+    prices = np.array([DIAGONAL_PRICE if dx != 0 and dy != 0 else 1.0 for dx, dy in steps])
+    return offsets, prices
+
+
+def shortest_paths(walkable, width, sources, targets=None, price=None):
+    """Dijkstra over a flat padded grid with a binary heap.
+
+    The inner loop reads plain lists made from the flat arrays because scalar
+    indexing of np.array is several times slower than of a list.
+
+    Args:
+        walkable (object): Flat np.array of bool walkability, see pad_walkable.
+        width (int): Width of the padded grid.
+        sources (list): Flat indices of cells where the search starts, with price 0 unless price is given.
+        targets (list): Flat indices of walkable cells, the search stops when all of them are settled.
+        Prices of other cells are then upper bounds. If None, all cells are settled.
+        price (list): Known prices of cells, the search starts from sources with these prices and only
+        lowers prices of other cells. If None, all cells start at inf and sources at 0.
+
+    Returns:
+        np.array of float prices of the shortest path from the nearest source, inf if unreachable.
+
+    """
+    offsets, prices = moore_offsets(width)
+    neighbours = list(zip(offsets.tolist(), prices.tolist()))
+    open_cells = walkable.tolist()
+    heap = []
+    if price is None:
+        price = [float("inf")] * len(open_cells)
+        for source in sources:
+            price[source] = 0.0
+    for source in sources:
+        heap.append((price[source], source))
+    # number of targets which are not settled yet, -1 if all cells are settled
+    pending = -1
+    if targets is not None:
+        is_target = [False] * len(open_cells)
+        for target in targets:
+            is_target[target] = True
+        pending = sum(is_target)
+    heapq.heapify(heap)
+    while heap:
+        current_price, current = heapq.heappop(heap)
+        if not open_cells[current]:
+            # already settled with a lower price
+            continue
+        open_cells[current] = False
+        if pending > 0 and is_target[current]:
+            pending -= 1
+            if pending == 0:
+                break
+        for offset, step in neighbours:
+            other = current + offset
+            if open_cells[other]:
+                other_price = current_price + step
+                if other_price < price[other]:
+                    price[other] = other_price
+                    heapq.heappush(heap, (other_price, other))
+    return np.array(price)
+
+
+def compute_source_field(grid, source, normalize=False):
+    """Static floor field of distances to the source cell.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+        source (int, int): xy coordinates of the source cell.
+        normalize (bool): SFF is normalized to [0, 1].
+
+    Returns:
+        np.array(height, width) of float distances, inf for obstacles.
+
+    """
+    height, width = grid.shape
+    x, y = source
+    static_field = shortest_paths(pad_walkable(grid), width + 2, [(y + 1) * (width + 2) + x + 1])
+    static_field = np.ascontiguousarray(static_field.reshape(height + 2, width + 2)[1:-1, 1:-1])
+    if normalize:
+        return normalize_grid(static_field)
+    return static_field
+
+
+def label_regions(walkable):
+    """Labels of 8-connected regions of walkable cells.
+
+    Args:
+        walkable (object): np.array(height, width) of bool.
+
+    Returns:
+        (np.array, int): np.array(height, width) of int region labels, -1 for other cells, and number of regions.
+
+    """
+    height, width = walkable.shape
+    padded_width = width + 2
+    open_cells = pad_walkable(np.where(walkable, 0, -1)).tolist()
+    offsets, _ = moore_offsets(padded_width)
+    offsets = offsets.tolist()
+    labels = np.full(shape=(height + 2) * (width + 2), fill_value=-1)
+    n_regions = 0
+    for start in range(len(open_cells)):
+        if not open_cells[start]:
+            continue
+        open_cells[start] = False
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            labels[current] = n_regions
+            for offset in offsets:
+                if open_cells[current + offset]:
+                    open_cells[current + offset] = False
+                    queue.append(current + offset)
+        n_regions += 1
+    return labels.reshape(height + 2, width + 2)[1:-1, 1:-1].copy(), n_regions
+
+
+def find_doors(grid, max_door_width=MAX_DOOR_WIDTH):
+    """Door cells, gaps of at most max_door_width cells in walls which are one cell thick.
+
+    A door cell lies in a short run of walkable cells along the wall, while both cells across
+    the wall are in longer runs, i.e. in rooms or wider corridors.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+        max_door_width (int): Maximal width of a door.
+
+    Returns:
+        np.array(height, width) of bool, True for door cells.
+
+    """
+    walkable = grid >= 0
+
+    def runs(mask):
+        # length of the run of walkable cells along rows which contains each cell
+        lengths = np.zeros(shape=mask.shape, dtype=int)
+        for row, line in enumerate(mask):
+            start = 0
+            for column in range(1, len(line) + 1):
+                if column == len(line) or line[column] != line[start]:
+                    if line[start]:
+                        lengths[row, start:column] = column - start
+                    start = column
+        return lengths
+
+    def gaps(mask, lengths):
+        # cells of short runs between two cells of longer runs across the run
+        doors = np.zeros(shape=mask.shape, dtype=bool)
+        doors[1:-1] = mask[1:-1] & (lengths[1:-1] <= max_door_width) & \
+            (lengths[:-2] > lengths[1:-1]) & (lengths[2:] > lengths[1:-1])
+        return doors
+
+    horizontal = runs(walkable)
+    vertical = runs(walkable.T).T
+    return gaps(walkable, horizontal) | gaps(walkable.T, vertical.T).T
+
+
+def region_distances(walkable, source, cells):
+    """Distances from source to cells by paths through walkable cells only.
+
+    The search runs in the bounding box of source and cells, which is small for one region of a map.
+
+    Args:
+        walkable (object): np.array(height, width) of bool.
+        source (int, int): xy coordinates of the source cell.
+        cells (np.array, np.array): y and x coordinates of walkable target cells.
+
+    Returns:
+        np.array(len(cells[0])) of float distances, inf if unreachable.
+
+    """
+    ys, xs = cells
+    x0, x1 = min(xs.min(), source[0]), max(xs.max(), source[0])
+    y0, y1 = min(ys.min(), source[1]), max(ys.max(), source[1])
+    box = np.where(walkable[y0:y1 + 1, x0:x1 + 1], 0, -1)
+    static_field = compute_source_field(box, (source[0] - x0, source[1] - y0))
+    return static_field[ys - y0, xs - x0]
+
+
+def compute_area_field(grid, cells, normalize=False):
+    """Static floor field of distances to the nearest of cells, e.g. cells of a goal area.
+
+    All cells are sources of one Dijkstra search, which is a single pass instead of one field per cell.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+        cells (list): xy coordinates of the source cells, obstacles among them are skipped.
+        normalize (bool): SFF is normalized to [0, 1].
+
+    Returns:
+        np.array(height, width) of float distances, inf for obstacles.
+
+    """
+    height, width = grid.shape
+    sources = [(y + 1) * (width + 2) + x + 1 for x, y in cells if grid[y, x] >= 0]
+    if len(sources) == 0:
+        raise ValueError("Area " + str(cells) + " has no walkable cell. Can't compute static field.")
+    static_field = shortest_paths(pad_walkable(grid), width + 2, sources)
+    static_field = np.ascontiguousarray(static_field.reshape(height + 2, width + 2)[1:-1, 1:-1])
     if normalize:
         return normalize_grid(static_field)
     return static_field
+
+
+def repair_source_field(grid, static_field, opened):
+    """Static floor field updated after obstacles at opened cells were removed from the grid.
+
+    Removing obstacles only shortens paths, so the search starts from the walkable neighbours of
+    opened cells with their known prices and visits only the cells whose price decreases.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols after the edit, negative values are obstacles.
+        static_field (object): np.array(height, width) of exact float distances before the edit,
+        inf for obstacles of the edited grid.
+        opened (list): xy coordinates of cells which were obstacles before the edit.
+
+    Returns:
+        np.array(height, width) of float distances, inf for obstacles.
+
+    """
+    height, width = grid.shape
+    padded_width = width + 2
+    walkable = pad_walkable(grid)
+    price = np.full(shape=(height + 2, width + 2), fill_value=float("inf"))
+    price[1:-1, 1:-1] = static_field
+    price = price.ravel()
+    offsets, _ = moore_offsets(padded_width)
+    sources = set()
+    for x, y in opened:
+        cell = (y + 1) * padded_width + x + 1
+        price[cell] = float("inf")
+        sources.update(cell + offset for offset in offsets.tolist() if walkable[cell + offset])
+    sources = [source for source in sources if price[source] < float("inf")]
+    price = shortest_paths(walkable, padded_width, sources, price=price.tolist())
+    return np.ascontiguousarray(price.reshape(height + 2, width + 2)[1:-1, 1:-1])
+
+
+def compute_target_distances(grid, source, targets):
+    """Distances from the source cell to the target cells.
+
+    The search stops as soon as all targets are reached, so near targets are much cheaper than a full field.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+        source (int, int): xy coordinates of the source cell.
+        targets (list): xy coordinates of walkable target cells.
+
+    Returns:
+        np.array(len(targets)) of float distances, inf if unreachable.
+
+    """
+    width = grid.shape[1] + 2
+    x, y = source
+    targets = [(ty + 1) * width + tx + 1 for tx, ty in targets]
+    price = shortest_paths(pad_walkable(grid), width, [(y + 1) * width + x + 1], targets)
+    return price[targets]
+
+
+def compute_source_distances(grid, sources, idx):
+    """Distances from the source cell sources[idx] to sources[idx:].
+
+    The distance of a pair of cells is symmetric, so distances to sources[:idx] are
+    already known from the earlier sources and the search stops once sources[idx:] are reached.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+        sources (list): xy coordinates of walkable cells.
+        idx (int): Index of the source cell in sources.
+
+    Returns:
+        np.array(len(sources) - idx) of float distances, inf if unreachable.
+
+    """
+    return compute_target_distances(grid, sources[idx], sources[idx:])
+
+
+def sweep_rows(fields, walkable):
+    """One pass over rows downwards and one upwards, each row is relaxed from the previous row.
+
+    Args:
+        fields (object): np.array(n_sources, height, width) of float distances, updated in place.
+        walkable (object): np.array(height, width) of bool.
+
+    """
+    height = fields.shape[1]
+    for rows, previous in [(range(1, height), -1), (range(height - 2, -1, -1), 1)]:
+        for y in rows:
+            above = fields[:, y + previous]
+            candidates = above + 1
+            np.minimum(candidates[:, 1:], above[:, :-1] + DIAGONAL_PRICE, out=candidates[:, 1:])
+            np.minimum(candidates[:, :-1], above[:, 1:] + DIAGONAL_PRICE, out=candidates[:, :-1])
+            candidates[:, ~walkable[y]] = float("inf")
+            np.minimum(fields[:, y], candidates, out=fields[:, y])
+
+
+def compute_source_fields_wavefront(grid, sources):
+    """Static floor fields of many sources at once by NumPy sweeps over a stacked array.
+
+    Chamfer sweeps with the 1 and sqrt(2) stencil over rows and columns in both directions are
+    repeated until no distance changes. Every sweep handles all sources in one array operation
+    per row, so the Python overhead is shared by the batch, unlike one heap search per source.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols, negative values are obstacles.
+        sources (list): xy coordinates of source cells.
+
+    Returns:
+        np.array(len(sources), height, width) of float distances, inf for obstacles.
+
+    """
+    walkable = grid >= 0
+    fields = np.full(shape=(len(sources),) + grid.shape, fill_value=float("inf"))
+    xs = [x for x, _ in sources]
+    ys = [y for _, y in sources]
+    fields[np.arange(len(sources)), ys, xs] = 0
+    while True:
+        previous = fields.copy()
+        sweep_rows(fields, walkable)
+        # columns are rows of the transposed view, the sweep updates fields in place
+        sweep_rows(fields.transpose(0, 2, 1), walkable.T)
+        if np.array_equal(previous, fields):
+            return fields
+
+
+def compute_static_field(grid, normalize=False, backend=SFF_BACKENDS[0]):
+    """Static floor field of distances to the gate cell.
+
+    Args:
+        grid (object): np.array(height, width) of map symbols with a gate.
+        normalize (bool): SFF is normalized to [0, 1].
+        backend (str): One of SFF_BACKENDS, heap based Dijkstra or NumPy wavefront sweeps.
+
+    Returns:
+        np.array(height, width) of float distances, inf for obstacles.
+
+    """
+    gates = np.argwhere(grid == MAP_SYMBOLS[GATE])
+    if len(gates) == 0:
+        raise ValueError("Gate is not present in the map. Can't compute static field.")
+    # the last gate in row order is used, as in the reference implementation
+    y, x = gates[-1]
+    if backend not in SFF_BACKENDS:
+        raise ValueError("Unknown SFF backend " + str(backend))
+    if backend == "wavefront":
+        static_field = compute_source_fields_wavefront(grid, [(x, y)])[0]
+        if normalize:
+            return normalize_grid(static_field)
+        return static_field
+    return compute_source_field(grid, (x, y), normalize)
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def spawn_seeds(seed, n):
+    """Seeds of n independent random streams spawned from seed, for replicas of a simulation.
+
+    Args:
+        seed (int): Root seed, None for fresh entropy.
+        n (int): Number of streams.
+
+    Returns:
+        list: int seeds, the same for the same seed no matter which process uses them.
+
+    """
+    children = np.random.SeedSequence(seed).spawn(n)
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in children]
+
+
+class UniformStream:
+    """Uniform numbers in [0, 1) of a generator, drawn in blocks and handed out in order.
+
+    The numbers are the same as from consecutive calls of rng.random(), the block size only reduces
+    the number of calls of the generator.
+
+    Attributes:
+        rng (np.random.Generator): Source of the numbers.
+        block_size (int): Number of numbers drawn at once.
+        block (np.array): np.array(block_size) of float numbers of the current block.
+        position (int): Index of the next number in block.
+
+    """
+    def __init__(self, rng, block_size=1024):
+        if block_size < 1:
+            raise ValueError("Block size must be at least 1.")
+        self.rng = rng
+        self.block_size = block_size
+        self.block = np.empty(0)
+        self.position = 0
+
+    def random(self):
+        """The next uniform number."""
+        if self.position == len(self.block):
+            self.block = self.rng.random(self.block_size)
+            self.position = 0
+        u = self.block[self.position]
+        self.position += 1
+        return u
+
+    def random_sample(self, n):
+        """np.array(n) of the next n uniform numbers."""
+        available = len(self.block) - self.position
+        if n <= available:
+            sample = self.block[self.position:self.position + n]
+            self.position += n
+            return sample
+        # the rest of the block continues with new numbers, the next block starts after them
+        sample = np.concatenate((self.block[self.position:], self.rng.random(n - available)))
+        self.block = np.empty(0)
+        self.position = 0
+        return sample
@@ -7,7 +7,7 @@ from ..file_loader import FileLoader
 
 filename = "./maps/topology/10V.txt"
 filename = os.path.abspath(filename)
-fl = FileLoader(filename)
+fl = FileLoader(filename, progressive=True)
 canvas = fl.get_canvas(1080)
 
 model_params = {
@@ -0,0 +1,97 @@
+import numpy as np
+
+from .utils.constants import MAP_SYMBOLS, OBSTACLE, MOORE_MOVES, PARTNER_OFFSETS, MANEUVER_OFFSETS
+
+
+def bitmask(bits):
+    """Pack np.array(n, height, width) of bool into np.array(height, width) of uint32, bit i is bits[i]."""
+    weights = (1 << np.arange(len(bits), dtype=np.uint32)).reshape(-1, 1, 1)
+    return np.bitwise_or.reduce(bits * weights, axis=0).astype(np.uint32)
+
+
+def unpack(mask, n):
+    """np.array(n) of bool bits of int mask."""
+    return (mask >> np.arange(n, dtype=np.uint32)) & 1 == 1
+
+
+class Walkability:
+    """Corner cuts of moves of agents and maneuvers of pairs from each cell of the room as bitmasks.
+
+    Tables are built once from the room, obstacles and borders of the grid do not change during the simulation.
+    A cell is legal if it is in the grid and not an obstacle. A diagonal move cuts a corner
+    if one of the two cells next to the agent in its direction is an obstacle.
+
+    Attributes:
+        walkable (object): np.array(height, width) of bool, the cell is not an obstacle.
+        corners (object): np.array(height, width) of uint32, bit k for move MOORE_MOVES[k] which cuts a corner.
+        maneuvers (dict): ORIENTATION(key) and np.array(height, width) of uint32 bitmasks(value) of the leader's cell,
+            bit i for maneuver i of MANEUVER_OFFSETS which moves both agents to cells in the grid.
+        feasible (dict): ORIENTATION(key) and np.array(height, width) of uint32 bitmasks(value) of the leader's cell,
+            bit i for maneuver i which moves both agents to legal cells.
+        crossings (dict): ORIENTATION(key) and np.array(height, width) of uint32 bitmasks(value) of the leader's cell,
+            bit i for maneuver i in which leader or partner cuts a corner.
+
+    """
+    def __init__(self, room):
+        self.walkable = room != MAP_SYMBOLS[OBSTACLE]
+        height, width = self.walkable.shape
+        # cells outside of the grid are not walkable
+        padded = np.pad(self.walkable, 2, constant_values=False)
+        ys, xs = np.mgrid[0:height, 0:width]
+        self.corners = bitmask([self.cuts_corner(padded, xs, ys, xs + dx, ys + dy) for dx, dy in MOORE_MOVES])
+        self.maneuvers = {}
+        self.feasible = {}
+        self.crossings = {}
+        inside = np.pad(np.ones_like(self.walkable), 2, constant_values=False)
+        for orientation, offsets in MANEUVER_OFFSETS.items():
+            partner_dx, partner_dy = PARTNER_OFFSETS[orientation]
+            in_grid = []
+            feasible = []
+            crossing = []
+            for (leader_dx, leader_dy), (dx, dy) in offsets:
+                in_grid.append(self.walkable_at(inside, xs + leader_dx, ys + leader_dy) &
+                               self.walkable_at(inside, xs + dx, ys + dy))
+                feasible.append(self.walkable_at(padded, xs + leader_dx, ys + leader_dy) &
+                                self.walkable_at(padded, xs + dx, ys + dy))
+                # offsets of both agents are from the leader's cell, the partner starts next to it
+                crossing.append(self.cuts_corner(padded, xs, ys, xs + leader_dx, ys + leader_dy) |
+                                self.cuts_corner(padded, xs + partner_dx, ys + partner_dy, xs + dx, ys + dy))
+            self.maneuvers[orientation] = bitmask(in_grid)
+            self.feasible[orientation] = bitmask(feasible)
+            self.crossings[orientation] = bitmask(crossing)
+
+    @staticmethod
+    def walkable_at(padded, xs, ys):
+        """np.array of bool walkability of cells xs, ys of the room padded by 2 cells."""
+        return padded[ys + 2, xs + 2]
+
+    @staticmethod
+    def cuts_corner(padded, xs, ys, targets_x, targets_y):
+        """np.array of bool, diagonal move from xs, ys to targets cuts a corner, same as Agent.cross_obstacle."""
+        step_x = np.where(xs < targets_x, 1, -1)
+        step_y = np.where(ys < targets_y, 1, -1)
+        diagonal = (xs != targets_x) & (ys != targets_y)
+        return diagonal & ~(Walkability.walkable_at(padded, xs + step_x, ys) &
+                            Walkability.walkable_at(padded, xs, ys + step_y))
+
+    def cross_obstacle(self, pos, target):
+        """Indicator of a move from xy coordinates pos to target cutting a corner, target can be further than 1 cell."""
+        if pos[0] == target[0] or pos[1] == target[1]:
+            return False
+        # index of the diagonal move in the same direction, the center is skipped in MOORE_MOVES
+        k = 3 * (1 if pos[0] < target[0] else -1) + (1 if pos[1] < target[1] else -1) + 4
+        k -= k > 4
+        return bool(self.corners[pos[1], pos[0]] >> k & 1)
+
+    def maneuver_masks(self, orientation, pos):
+        """Maneuvers of the pair with the leader at xy coordinates pos.
+
+        Returns:
+            (np.array, np.array, np.array): np.array(n_maneuvers) of bool maneuvers of both agents into the grid,
+            into walkable cells and cutting a corner.
+
+        """
+        x, y = pos
+        n = len(MANEUVER_OFFSETS[orientation])
+        return unpack(self.maneuvers[orientation][y, x], n), unpack(self.feasible[orientation][y, x], n), \
+            unpack(self.crossings[orientation][y, x], n)
@@ -1,30 +1,55 @@
 import os
+import glob
+import time
+import multiprocessing
 
 import mesa
+import numpy as np
 
 from roommodel.model import RoomModel
 from roommodel.file_loader import FileLoader
+from roommodel.utils.stream import spawn_seeds
 
 
-def batch(filename, n=10):
-    # this method runs n simulations of filename map. The global parameters can be set in the declaration of model
-    # variable
+def create_model(fl, seed):
+    # model of one simulation of batch, the global parameters are set here for serial and parallel runs alike
+    return RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=3,
+                     penalization_orientation=1.0, leader_front_location_switch=True, fileloader=fl, seed=seed)
+
+
+def run_replica(filename, seed):
+    # runs one simulation of filename map with its own random stream in a worker process of batch
+    model = create_model(FileLoader(filename), seed)
+    model.run_model()
+    return model.schedule.steps
+
+
+def batch(filename, n=10, seed=None, processes=1):
+    # this method runs n simulations of filename map. The global parameters can be set in create_model.
+    # Each simulation has an independent random stream spawned from seed, so the same seed reproduces
+    # all of them no matter how many processes run them. Experiments of the datacollector write to shared files,
+    # enable them only with one process
     filename = os.path.abspath(filename)
     fl = FileLoader(filename)
     print("\t", filename)
-    for i in range(n):
-        print(i)
-        model = RoomModel(ks=3.0, ko=0.0, kd=0.0, leader_movement_duration=2, agent_movement_duration=3,
-                          penalization_orientation=1.0, leader_front_location_switch=True,
-                          fileloader=fl)
-        model.run_model()
+    seeds = spawn_seeds(seed, n)
+    if processes == 1:
+        for i in range(n):
+            print(i)
+            model = create_model(fl, seeds[i])
+            model.run_model()
+        return
+    with multiprocessing.Pool(processes) as pool:
+        for i, steps in enumerate(pool.starmap(run_replica, [(filename, replica_seed) for replica_seed in seeds])):
+            print(i, "steps:", steps)
 
 
 def visualize(filename):
     # this method starts a web browser visualization of simulation in filename map
     # the global parameters can be set in model_params
     filename = os.path.abspath(filename)
-    fl = FileLoader(filename)
+    # missing fields are computed in the background, the page opens before they are ready
+    fl = FileLoader(filename, progressive=True)
     # model visualization resolution
     canvas = fl.get_canvas(1080)
     # global parameters, the values are:
@@ -50,6 +75,46 @@ def visualize(filename):
     server.launch()
 
 
+def precompute_map(filename, dtype=np.float64, pairwise=False):
+    # builds SFF of one map in a worker process of precompute, returns the build time
+    start = time.perf_counter()
+    FileLoader(filename, processes=1, dtype=dtype, pairwise=pairwise)
+    return time.perf_counter() - start
+
+
+def precompute(topology_folder="./maps/topology", processes=None, dtype=np.float64, pairwise=False):
+    # this method builds SFF of all maps in topology_folder before experiments, maps with valid stored SFF are
+    # skipped and maps with the same room share the fields, the rest is built concurrently one map per process
+    loaders = {}
+    for filename in sorted(glob.glob(os.path.join(topology_folder, "*.txt"))):
+        filename = os.path.abspath(filename)
+        try:
+            loaders[filename] = FileLoader(filename, static_fields=False, dtype=dtype, pairwise=pairwise)
+        except ValueError as e:
+            print(os.path.basename(filename).ljust(26), "skipped:", e)
+    builds = {}
+    for filename, fl in loaders.items():
+        if not fl.sff_cached() and fl.sff_folder() not in builds:
+            builds[fl.sff_folder()] = filename
+    processes = min(processes or os.cpu_count() or 1, max(1, len(builds)))
+    with multiprocessing.Pool(processes) as pool:
+        results = {filename: pool.apply_async(precompute_map, (filename, dtype, pairwise))
+                   for filename in builds.values()}
+        times = {filename: result.get() for filename, result in results.items()}
+    print("map".ljust(26), "fields".ljust(10), "status".ljust(34), "time s".rjust(7), "size MB".rjust(8))
+    for filename, fl in loaders.items():
+        folder = fl.sff_folder()
+        if filename in times:
+            status = "built"
+        elif folder in builds:
+            status = "shared with " + os.path.basename(builds[folder])
+        else:
+            status = "cached"
+        size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+        print(os.path.basename(filename).ljust(26), os.path.basename(folder)[:8].ljust(10), status.ljust(34),
+              ('%.2f' % times.get(filename, 0)).rjust(7), ('%.2f' % (size / 2 ** 20)).rjust(8))
+
+
 if __name__ == '__main__':
     # filename examples of provided maps
 
@@ -88,6 +153,7 @@ if __name__ == '__main__':
         "./maps/topology/map22_mirror.txt",
         "./maps/topology/map23_mirror.txt",
     ]
+    # precompute()
     filename = "./maps/topology/map22.txt"
     visualize(filename)
     # n = 1